@@ -0,0 +1,50 @@
+from flask import Flask
+from flask_cors import CORS
+from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from flask_wtf.csrf import CSRFProtect
+
+from app.cache import ResponseCache
+from app.database import RoutingSession, configure_engines
+from app.jobs import JobRunner
+from app.metrics import Metrics
+from app.serialization import configure_compression, \
+    configure_serialization
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+cache = ResponseCache()
+jobs = JobRunner()
+metrics = Metrics()
+# csrf = CSRFProtect()
+
+
+def create_app():
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+    app.config.from_object('app.config.Config')
+
+    configure_serialization(app)
+    configure_engines(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    cache.init_app(app)
+    jobs.init_app(app)
+    metrics.init_app(app)
+    configure_compression(app)
+    # csrf.init_app(app)
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": "http://localhost:5173"}},
+        supports_credentials=True
+    )
+
+    from app import serializers  # noqa: F401 - registers the model encoders
+    from app.recipes.routes import recipe_bp
+    from app.ingredients.routes import ingredient_bp
+    from app.recipe_types.routes import recipe_type_bp
+
+    app.register_blueprint(recipe_bp, url_prefix='/api/recipes')
+    app.register_blueprint(ingredient_bp, url_prefix='/api/ingredients')
+    app.register_blueprint(recipe_type_bp, url_prefix='/api/types')
+
+    return app
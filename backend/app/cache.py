@@ -0,0 +1,267 @@
+"""
+Response cache for read endpoints, keyed on per-table version counters.
+
+Read views declare the tables their output depends on with
+``@cache.cached(...)``; write paths call ``cache.bump(...)`` for the tables
+they changed once their transaction is committed. A cached body is stored
+under the request path plus the current versions of its tables, so a bump
+makes every stale entry unreachable instead of having to find and delete it.
+The ETag is derived from the same key, which lets a conditional GET be
+answered with a 304 before the view or the store is even consulted. Keys
+include the negotiated format, and compressed bodies are stored next to the
+plain ones so they are only compressed once.
+
+The in-process indexes (pantry, suggestions, similar recipes) follow the
+same versions with ``TableWatch`` to notice writes made by other workers.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from hashlib import blake2b
+
+from flask import Response, current_app, make_response, request
+
+from app.database import use_primary
+from app.serialization import choose_encoding, compress, negotiate
+
+
+class MemoryStore:
+    """Versions and bodies kept inside the current process."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._bodies = OrderedDict()
+
+    def versions(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+
+class SQLiteStore:
+    """
+    Versions and bodies kept in a local SQLite file.
+
+    Every worker process on the host that points at the same file sees the
+    same versions, so a write handled by one worker invalidates the entries
+    of all of them.
+    """
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS version "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS body "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_body_used ON body (used)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO version VALUES ('__epoch__', ?)",
+                (uuid.uuid4().int >> 80,)
+            )
+            self.epoch = str(connection.execute(
+                "SELECT value FROM version WHERE name = '__epoch__'"
+            ).fetchone()[0])
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def versions(self, tables):
+        rows = dict(self._connect().execute(
+            "SELECT name, value FROM version WHERE name IN (%s)"
+            % ','.join('?' * len(tables)), tables
+        ))
+        return tuple(rows.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO version VALUES (?, 1) ON CONFLICT (name) "
+                "DO UPDATE SET value = value + 1",
+                [(table,) for table in tables]
+            )
+
+    def get(self, key):
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT value FROM body WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE body SET used = ? WHERE key = ?", (time.time(), key)
+        )
+        return row[0]
+
+    def set(self, key, body):
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO body VALUES (?, ?, ?)",
+                (key, body, time.time())
+            )
+            connection.execute(
+                "DELETE FROM body WHERE key IN (SELECT key FROM body "
+                "ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+class TableWatch:
+    """
+    The versions of ``tables`` an in-process index last caught up with.
+
+    With the sqlite store the versions are shared by every worker of the
+    host, so an index that checks them before answering sees the writes the
+    other workers made; with the memory store it only sees its own.
+    """
+
+    def __init__(self, *tables):
+        self.tables = tuple(sorted(tables))
+        self._seen = None
+
+    def _current(self):
+        return current_app.extensions['response_cache'].versions(self.tables)
+
+    def changed(self):
+        """True, once, when the tables changed since the last check."""
+        versions = self._current()
+        if versions == self._seen:
+            return False
+        self._seen = versions
+        return True
+
+    def follow(self):
+        """
+        Catch up with a write of this worker, after it was bumped. False
+        when the tables changed by more than that write: the index must
+        then be rebuilt rather than updated.
+        """
+        versions = self._current()
+        if self._seen is None or any(
+                not 0 <= new - old <= 1
+                for new, old in zip(versions, self._seen)):
+            return False
+        self._seen = versions
+        return True
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        max_entries = app.config['RESPONSE_CACHE_SIZE']
+        if app.config['RESPONSE_CACHE'] == 'sqlite':
+            path = app.config['RESPONSE_CACHE_PATH']
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            store = SQLiteStore(path, max_entries)
+        else:
+            store = MemoryStore(max_entries)
+        app.extensions['response_cache'] = store
+
+    @property
+    def store(self):
+        return current_app.extensions['response_cache']
+
+    def bump(self, *tables):
+        """Invalidate every cached response that depends on ``tables``."""
+        self.store.bump(tables)
+
+    def cached(self, *tables):
+        """Cache the JSON body of a GET view until one of ``tables`` changes."""
+        tables = tuple(sorted(tables))
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                store = self.store
+                versions = store.versions(tables)
+                mimetype = negotiate()
+                encoding = choose_encoding()
+                key = (f"{store.epoch}|{mimetype}|{request.full_path}|"
+                       f"{versions}")
+                # One ETag per representation, compressed or not.
+                etag = blake2b(f"{key}|{encoding}".encode(),
+                               digest_size=16).hexdigest()
+
+                if request.if_none_match.contains(etag):
+                    response = Response(status=304)
+                else:
+                    body = store.get(f"{key}|{encoding}") if encoding \
+                        else None
+                    if body is None:
+                        body = store.get(key)
+                        if body is None:
+                            # The key holds the primary's versions: a
+                            # lagging replica must not fill it.
+                            use_primary()
+                            response = make_response(view(*args, **kwargs))
+                            # Streamed bodies are never buffered into the
+                            # cache.
+                            if response.status_code != 200 or \
+                                    response.is_streamed:
+                                return response
+                            body = response.get_data()
+                            store.set(key, body)
+                        if encoding and len(body) >= \
+                                current_app.config['COMPRESS_MIN_BYTES']:
+                            body = compress(body, encoding)
+                            store.set(f"{key}|{encoding}", body)
+                        else:
+                            encoding = None
+                    response = Response(body, mimetype=mimetype)
+                    if encoding:
+                        response.headers['Content-Encoding'] = encoding
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                response.vary.update(('Accept', 'Accept-Encoding'))
+                return response
+
+            return wrapper
+
+        return decorator
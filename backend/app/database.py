@@ -0,0 +1,125 @@
+"""
+Engine configuration and read replica routing.
+
+The primary database is ``SQLALCHEMY_DATABASE_URI``; every URI listed in
+``DATABASE_REPLICA_URLS`` becomes a ``replica_<n>`` bind. Views marked with
+``@read_only`` run their queries on one replica picked per session; anything
+else, including every flush and every query outside a request, goes to the
+primary.
+
+Replicas lag behind the primary, so a client that has just written keeps
+reading from the primary: a request that commits sets a cookie for
+``REPLICA_STICKY_SECONDS``, and read-only requests carrying it are routed to
+the primary as well.
+
+The response cache stores bodies under the table versions of the primary,
+so a cached view that misses renders from the primary too (``use_primary``):
+a lagging replica would otherwise leave a stale body under the new versions
+until the next write.
+
+Locally, two SQLite files (or two local Postgres databases) kept in sync by
+hand are enough to watch the routing work.
+"""
+import random
+import time
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+STICKY_COOKIE = 'db_primary_until'
+
+
+def _is_memory_sqlite(url):
+    url = sa.engine.make_url(url)
+    return url.get_backend_name() == 'sqlite' and \
+        url.database in (None, '', ':memory:')
+
+
+def engine_options(config, url):
+    """Pool and timeout settings from ``config`` that apply to ``url``."""
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING'],
+               'pool_recycle': config['DB_POOL_RECYCLE']}
+    # In-memory SQLite runs on a single static connection.
+    if not _is_memory_sqlite(url):
+        options.update(pool_size=config['DB_POOL_SIZE'],
+                       max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'])
+    timeout = config['DB_STATEMENT_TIMEOUT']
+    if timeout and sa.engine.make_url(url).get_backend_name() == 'postgresql':
+        options['connect_args'] = {
+            'options': f"-c statement_timeout={timeout}"
+        }
+    return options
+
+
+def configure_engines(app):
+    """Fill the engine options and replica binds in before ``db.init_app``."""
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for n, url in enumerate(config['DATABASE_REPLICA_URLS']):
+        binds[f'replica_{n}'] = {'url': url, **engine_options(config, url)}
+    config['SQLALCHEMY_BINDS'] = binds
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote'):
+            seconds = app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(STICKY_COOKIE, str(time.time() + seconds),
+                                max_age=seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+def read_only(view):
+    """Let the queries of ``view`` be served by a read replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def use_primary():
+    """Send the remaining queries of the request to the primary."""
+    g.db_primary = True
+
+
+def _recently_wrote():
+    if g.get('db_wrote'):
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class RoutingSession(Session):
+    """Session sending the reads of ``@read_only`` views to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and g.get('db_read_only') and not g.get('db_primary') \
+                and not _recently_wrote():
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if key and key.startswith('replica_')]
+            if replicas:
+                if 'replica' not in self.info:
+                    self.info['replica'] = random.choice(replicas)
+                return self.info['replica']
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_write(session):
+    # Reads never commit, so any commit made during a request is a write.
+    if has_request_context():
+        g.db_wrote = True
+
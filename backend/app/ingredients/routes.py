@@ -0,0 +1,121 @@
+from flask import current_app, request, jsonify, Blueprint
+from sqlalchemy.exc import IntegrityError
+
+from app import cache, db
+from app.database import read_only, use_primary
+from app.ingredients.suggest import get_suggest_index, suggest_from_database
+from app.models import Ingredient
+from app.streaming import STREAM_FORMATS, streamed_response
+
+
+ingredient_bp = Blueprint('ingredient', __name__)
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+# rows fetched per round-trip when streaming the list
+STREAM_BATCH_SIZE = 1000
+
+
+@ingredient_bp.route('/')
+@read_only
+@cache.cached('ingredient')
+def list_ingredients():
+    stream_format = request.args.get('stream')
+    if stream_format is not None:
+        if stream_format not in STREAM_FORMATS:
+            return jsonify(
+                {"error": "'stream' must be 'json' or 'ndjson'"}
+            ), 400
+        # Plain rows through a server-side cursor; no ORM objects at all.
+        rows = db.session.execute(
+            db.select(Ingredient.id, Ingredient.name)
+            .order_by(Ingredient.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        return streamed_response('ingredients', ({
+            'id': ingredient_id,
+            'name': name
+        } for ingredient_id, name in rows), stream_format)
+
+    ingredients = Ingredient.query.all()
+
+    return jsonify({'ingredients': ingredients})
+
+
+@ingredient_bp.route('/suggest')
+@read_only
+def suggest_ingredients():
+    prefix = request.args.get('prefix', '').strip()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify(
+            {"error": f"'limit' must be between 1 and {MAX_SUGGESTIONS}"}
+        ), 400
+    if not prefix:
+        return jsonify({'ingredients': []})
+
+    if current_app.config['INGREDIENT_INDEX'] == 'database':
+        suggestions = suggest_from_database(prefix, limit)
+    else:
+        suggestions = get_suggest_index().suggest(prefix, limit)
+
+    ingredient_list = [{
+        'id': ingredient_id,
+        'name': name
+    } for ingredient_id, name in suggestions]
+
+    return jsonify({'ingredients': ingredient_list})
+
+
+def _find_ingredient(name):
+    return Ingredient.query.filter(
+        db.func.lower(Ingredient.name) == db.func.lower(name)
+    ).first()
+
+
+@ingredient_bp.route('/add', methods=['POST'])
+def add_ingredient():
+    """
+    Return the ingredient with the given name, creating it if needed.
+
+    Names are matched regardless of case, so repeating a request answers
+    200 with the existing ingredient instead of adding a duplicate.
+    """
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({"message": "Ingredient name is required"}), 400
+
+    status = 200
+    ingredient = _find_ingredient(name)
+    if ingredient is None:
+        try:
+            ingredient = Ingredient(name=name, category_id=1)
+            db.session.add(ingredient)
+            db.session.commit()
+        except IntegrityError as e:
+            # Created by a concurrent request since the lookup, which only
+            # the primary is sure to show yet.
+            db.session.rollback()
+            use_primary()
+            ingredient = _find_ingredient(name)
+            if ingredient is None:
+                # Another constraint failed, e.g. a missing category.
+                return jsonify(
+                    {"message": f"Error while adding ingredient: {e.orig}"}
+                ), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify(
+                {"message": f"Error while adding ingredient: {e}"}
+            ), 400
+        else:
+            status = 201
+            cache.bump('ingredient')
+            get_suggest_index().add(ingredient.id, ingredient.name)
+
+    return jsonify({"ingredient": ingredient}), status
@@ -0,0 +1,228 @@
+"""
+Typeahead suggestions over ``Ingredient.name``.
+
+By default suggestions come from a process-local index holding the
+normalized names in sorted order, for exact prefix lookups, and a trigram
+index, for prefixes with typos. A typo changes up to four trigrams, which
+is most of those of a short prefix, so the trigrams only pick the
+candidates: a name is kept if its start is within ``max_typos`` edits of
+the prefix, or if it shares most of the prefix trigrams. With
+``INGREDIENT_INDEX = 'database'`` the lookup goes to the ``pg_trgm`` index
+on PostgreSQL or a plain prefix scan elsewhere.
+
+The local index adds the ingredients this worker creates and is rebuilt
+when the ``ingredient`` version shows that another worker changed them.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.cache import TableWatch
+from app.models import Ingredient
+
+# Share of the prefix trigrams a name must contain to count as a typo match.
+MIN_TRIGRAM_SCORE = 0.5
+# prefixes at least this long may hold two typos instead of one
+TWO_TYPOS_LENGTH = 8
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+
+def prefix_trigrams(value):
+    """Trigrams of ``value`` anchored at the start, like pg_trgm pads."""
+    padded = '  ' + value
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(prefix):
+    return 2 if len(prefix) >= TWO_TYPOS_LENGTH else 1
+
+
+def _one_edit(prefix, name):
+    """Whether a single edit turns ``prefix`` into a start of ``name``."""
+    # where they first differ
+    i = next((i for i, (char, other) in enumerate(zip(prefix, name))
+              if char != other), min(len(prefix), len(name)))
+    rest = prefix[i + 1:]
+    return name.startswith(rest, i + 1) or \
+        name.startswith(rest, i) or \
+        name.startswith(prefix[i:], i + 1) or \
+        (prefix[i + 1:i + 2] == name[i:i + 1] and
+         prefix[i:i + 1] == name[i + 1:i + 2] and
+         name.startswith(prefix[i + 2:], i + 2))
+
+
+def prefix_distance(prefix, name, bound):
+    """
+    Edits (insertions, deletions, substitutions and swaps of neighbours)
+    between ``prefix`` and the closest start of ``name``; any value above
+    ``bound`` means "too far".
+    """
+    if name.startswith(prefix):
+        return 0
+    # Most candidates are checked with one edit allowed: string
+    # comparisons, without the table below.
+    if _one_edit(prefix, name):
+        return 1
+    if bound < 2:
+        return bound + 1
+    name = name[:len(prefix) + bound]
+    previous, row = None, list(range(len(name) + 1))
+    for i, char in enumerate(prefix, 1):
+        previous, before, row = row, previous, [i]
+        for j, other in enumerate(name, 1):
+            cost = min(previous[j] + 1, row[j - 1] + 1,
+                       previous[j - 1] + (char != other))
+            if before is not None and j > 1 and char == name[j - 2] and \
+                    prefix[i - 2] == other:
+                cost = min(cost, before[j - 2] + 1)
+            row.append(cost)
+        if min(row) > bound:
+            return bound + 1
+    # Any start of the name will do, so the best of the last row.
+    return min(row[max(0, len(prefix) - bound):], default=bound + 1)
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._watch = TableWatch('ingredient')
+        # sorted (normalized name, id) pairs
+        self._names = []
+        # trigram -> ids of the names containing it
+        self._trigrams = {}
+        self._by_id = {}
+
+    def _insert(self, ingredient_id, name):
+        normalized = normalize(name)
+        self._by_id[ingredient_id] = (name, normalized)
+        insort(self._names, (normalized, ingredient_id))
+        for trigram in prefix_trigrams(normalized):
+            self._trigrams.setdefault(trigram, []).append(ingredient_id)
+
+    def _ensure_built(self):
+        if not self._watch.changed() and self._built:
+            return
+        rows = db.session.query(Ingredient.id, Ingredient.name).all()
+        self._by_id = {
+            ingredient_id: (name, normalize(name))
+            for ingredient_id, name in rows
+        }
+        self._names = sorted(
+            (normalized, ingredient_id)
+            for ingredient_id, (_, normalized) in self._by_id.items()
+        )
+        trigrams = {}
+        for ingredient_id, (_, normalized) in self._by_id.items():
+            for trigram in prefix_trigrams(normalized):
+                trigrams.setdefault(trigram, []).append(ingredient_id)
+        self._trigrams = trigrams
+        self._built = True
+
+    def add(self, ingredient_id, name):
+        """Register an ingredient committed after the index was built."""
+        with self._lock:
+            if self._built and not self._watch.follow():
+                self._built = False
+            if self._built and ingredient_id not in self._by_id:
+                self._insert(ingredient_id, name)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return up to ``limit`` ``(id, name)`` pairs for ``prefix``.
+
+        Names starting with the prefix come first in alphabetical order; the
+        rest is filled with names sharing most of the prefix trigrams.
+        """
+        prefix = normalize(prefix)
+        with self._lock:
+            self._ensure_built()
+
+            start = bisect_left(self._names, (prefix,))
+            results = []
+            for normalized, ingredient_id in self._names[start:start + limit]:
+                if not normalized.startswith(prefix):
+                    break
+                results.append(ingredient_id)
+
+            if len(results) < limit and len(prefix) >= 3:
+                trigrams = prefix_trigrams(prefix)
+                hits = Counter(chain.from_iterable(
+                    self._trigrams.get(trigram, ()) for trigram in trigrams
+                ))
+                needed = len(trigrams) * MIN_TRIGRAM_SCORE
+                typos = max_typos(prefix)
+                # An edit takes away at most four of the trigrams (three,
+                # or four for a swap).
+                candidate = max(1, len(trigrams) - 4 * typos)
+                seen = set(results)
+                wanted = limit - len(results)
+                matches, closest, tier = [], 0, None
+                # Names starting with the prefix are all in ``seen``, so no
+                # match is closer than one edit: once ``wanted`` are that
+                # close, names sharing fewer trigrams cannot rank higher.
+                for ingredient_id, count in sorted(
+                        hits.items(), key=lambda hit: -hit[1]):
+                    if count < candidate or \
+                            count != tier and closest >= wanted:
+                        break
+                    tier = count
+                    if ingredient_id in seen:
+                        continue
+                    normalized = self._by_id[ingredient_id][1]
+                    distance = prefix_distance(prefix, normalized, typos)
+                    if distance <= typos or count >= needed:
+                        closest += distance == 1
+                        matches.append((distance, -count, len(normalized),
+                                        ingredient_id))
+                fuzzy = heapq.nsmallest(wanted, matches)
+                results += [match[-1] for match in fuzzy]
+
+            return [
+                (ingredient_id, self._by_id[ingredient_id][0])
+                for ingredient_id in results
+            ]
+
+
+def get_suggest_index():
+    """Return the ingredient suggestion index of the current application."""
+    return current_app.extensions.setdefault('ingredient_index',
+                                             SuggestIndex())
+
+
+def _escape_like(value):
+    return (value.replace('\\', '\\\\')
+            .replace('%', '\\%').replace('_', '\\_'))
+
+
+def suggest_from_database(prefix, limit=10):
+    """Same contract as ``SuggestIndex.suggest``, answered by the database."""
+    prefix = normalize(prefix)
+    params = {"prefix": _escape_like(prefix) + '%', "q": prefix,
+              "limit": limit}
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        rows = db.session.execute(text(
+            "SELECT id, name FROM ingredient "
+            "WHERE lower(name) LIKE :prefix ESCAPE '\\' "
+            "OR :q <% lower(name) "
+            "ORDER BY lower(name) LIKE :prefix ESCAPE '\\' DESC, "
+            "word_similarity(:q, lower(name)) DESC, lower(name), id "
+            "LIMIT :limit"
+        ), params)
+    else:
+        rows = db.session.execute(text(
+            "SELECT id, name FROM ingredient "
+            "WHERE lower(name) LIKE :prefix ESCAPE '\\' "
+            "ORDER BY lower(name), id LIMIT :limit"
+        ), params)
+    return [tuple(row) for row in rows]
@@ -0,0 +1,227 @@
+"""
+Bounded background job pool for slow, upstream-bound work.
+
+Jobs run on a fixed number of threads next to the request workers, so a
+request only has to accept the work and hand back a job id. At most
+``JOB_WORKERS + JOB_QUEUE_SIZE`` jobs are pending at any time; beyond that
+``submit`` raises ``JobQueueFull`` and the caller should answer 503.
+
+Work submitted with a ``key`` is coalesced: while a job with that key is
+pending, submitting it again returns the same job instead of starting a
+second one, so identical uploads share one run and one set of model calls.
+Progress published by a job is kept on it, and every follower replays it
+from the start.
+
+Jobs live in the memory of the process that accepted them, so status
+polling has to reach the same process.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class Job:
+    def __init__(self, timeout):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.timeout = timeout
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.future = None
+        # (event, data) published so far, see ``publish``
+        self.events = []
+        # requests interested in the result, see ``detach``
+        self._followers = 1
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    @property
+    def timed_out(self):
+        return (self.started is not None and self.finished is None and
+                time.monotonic() - self.started > self.timeout)
+
+    @property
+    def pending(self):
+        return self.status in ('queued', 'running')
+
+    def should_stop(self):
+        """Checked by the job function between its expensive steps."""
+        return self._cancel.is_set() or self.timed_out
+
+    def publish(self, event, data):
+        """Record progress for whoever follows the job."""
+        with self._changed:
+            self.events.append((event, data))
+            self._changed.notify_all()
+
+    def wait_events(self, start, timeout):
+        """
+        Events from index ``start`` on, waiting up to ``timeout`` seconds
+        for some; an empty list once the job is over.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: len(self.events) > start or not self.pending, timeout
+            )
+            return self.events[start:]
+
+    def attach(self):
+        with self._lock:
+            self._followers += 1
+
+    def detach(self):
+        """A follower lost interest; the last one to leave cancels the job."""
+        with self._lock:
+            self._followers -= 1
+            abandoned = self._followers <= 0
+        if abandoned:
+            self.cancel()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish('cancelled')
+        elif self.pending:
+            self._finish('cancelled')
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if not self.pending:
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.monotonic()
+        with self._changed:
+            self._changed.notify_all()
+
+    def to_dict(self):
+        if self.timed_out:
+            self._finish('timeout', error="Job took too long")
+
+        job = {'id': self.id, 'status': self.status}
+        if self.result is not None:
+            job['result'] = self.result
+        if self.error is not None:
+            job['error'] = self.error
+        return job
+
+
+class _Pool:
+    def __init__(self, workers, queue_size, timeout, ttl):
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        # key -> the pending job submitted with it
+        self._keyed = {}
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+        for key, job in list(self._keyed.items()):
+            if not job.pending:
+                del self._keyed[key]
+
+    def _run(self, job, fn):
+        with job._lock:
+            if not job.pending:
+                return
+            job.status = 'running'
+            job.started = time.monotonic()
+        try:
+            result = fn(job)
+        except Exception as e:
+            if job._cancel.is_set():
+                job._finish('cancelled')
+            elif job.timed_out:
+                job._finish('timeout', error="Job took too long")
+            else:
+                logging.error(f"Job {job.id} failed: {e}")
+                job._finish('failed', error=str(e))
+            return
+
+        if job._cancel.is_set():
+            job._finish('cancelled')
+        elif job.timed_out:
+            job._finish('timeout', error="Job took too long")
+        else:
+            job._finish('done', result=result)
+
+    def submit(self, fn, key=None):
+        with self._lock:
+            self._prune()
+            job = self._keyed.get(key) if key is not None else None
+            if job is not None and job.pending:
+                job.attach()
+                return job
+            pending = sum(1 for job in self._jobs.values() if job.pending)
+            if pending >= self.capacity:
+                raise JobQueueFull()
+            job = Job(self.timeout)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, fn)
+            if key is not None:
+                self._keyed[key] = job
+            return job
+
+    def add_done(self, result):
+        with self._lock:
+            self._prune()
+            job = Job(self.timeout)
+            job._finish('done', result=result)
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['jobs'] = _Pool(
+            workers=app.config['JOB_WORKERS'],
+            queue_size=app.config['JOB_QUEUE_SIZE'],
+            timeout=app.config['JOB_TIMEOUT'],
+            ttl=app.config['JOB_TTL'],
+        )
+
+    @property
+    def pool(self):
+        return current_app.extensions['jobs']
+
+    def submit(self, fn, key=None):
+        """
+        Run ``fn(job)`` on the pool and return the queued ``Job``, or the
+        pending job already submitted with the same ``key``.
+        """
+        return self.pool.submit(fn, key)
+
+    def done(self, result):
+        """Register a job that was answered without running anything."""
+        return self.pool.add_done(result)
+
+    def get(self, job_id):
+        return self.pool.get(job_id)
@@ -0,0 +1,275 @@
+"""
+Shared, guarded access to the model API.
+
+Every model call of the app goes through one ``ModelClient`` per
+application, a drop-in for the Groq client (``chat.completions.create``)
+that adds what a slow or failing upstream needs:
+
+* a global limit of ``LLM_MAX_IN_FLIGHT`` concurrent calls, with at most
+  ``LLM_MAX_WAITING`` callers waiting up to ``LLM_QUEUE_TIMEOUT`` seconds for
+  a slot; beyond that ``UpstreamSaturated`` is raised at once;
+* a ``LLM_TIMEOUT`` per attempt and up to ``LLM_RETRIES`` retries of
+  timeouts, connection errors, 429s and 5xxs, after a jittered exponential
+  backoff;
+* a circuit breaker that opens when, among the last ``LLM_BREAKER_WINDOW``
+  calls, the share of failures or of calls slower than
+  ``LLM_BREAKER_SLOW_SECONDS`` reaches ``LLM_BREAKER_ERROR_RATE``. While it
+  is open calls fail with ``CircuitOpen`` without reaching the upstream;
+  after ``LLM_BREAKER_COOLDOWN`` seconds a single trial call decides whether
+  it closes again.
+
+Views check ``retry_after()`` before accepting work, so a saturated or
+broken upstream is answered with a fast 503 instead of parked workers.
+"""
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+# Retry-After, in seconds, when every slot and wait place is taken
+SATURATED_RETRY_AFTER = 5
+# longest pause between two attempts of one call
+MAX_BACKOFF = 8.0
+
+
+class UpstreamUnavailable(Exception):
+    """The call was refused before reaching the model API."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamSaturated(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+def is_retryable(error):
+    """Timeouts, connection errors, rate limiting and server errors."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        'Timeout' in type(error).__name__ or \
+        'Connection' in type(error).__name__
+
+
+class CircuitBreaker:
+    def __init__(self, window, min_calls, error_rate, slow_seconds, cooldown):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._lock = threading.Lock()
+        # True for each recent call that failed or was too slow
+        self._outcomes = deque(maxlen=window)
+        self._opened = None
+        self._trial = False
+
+    def retry_after(self):
+        """Seconds before calls are let through again, 0 when they are."""
+        with self._lock:
+            if self.state != 'open':
+                return 0
+            return max(0, self.cooldown - (time.monotonic() - self._opened))
+
+    def before_call(self):
+        """Raise ``CircuitOpen`` or let the call through; True for a trial."""
+        with self._lock:
+            if self.state == 'open':
+                remaining = self.cooldown - (time.monotonic() - self._opened)
+                if remaining > 0:
+                    raise CircuitOpen("The model API is failing, retry later",
+                                      remaining)
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._trial:
+                    raise CircuitOpen("The model API is being probed",
+                                      self.cooldown)
+                self._trial = True
+                return True
+            return False
+
+    def cancel_trial(self):
+        """The trial call never reached the upstream: let another try."""
+        with self._lock:
+            self._trial = False
+
+    def _open(self):
+        self.state = 'open'
+        self._opened = time.monotonic()
+        self._outcomes.clear()
+
+    def record(self, ok, seconds):
+        failed = not ok or seconds > self.slow_seconds
+        with self._lock:
+            if self.state == 'half_open':
+                self._trial = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = 'closed'
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and \
+                    sum(self._outcomes) / len(self._outcomes) >= \
+                    self.error_rate:
+                self._open()
+
+
+class Limiter:
+    """A semaphore whose wait queue is bounded."""
+
+    def __init__(self, limit, max_waiting):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self._changed = threading.Condition()
+
+    @property
+    def saturated(self):
+        return self.in_flight >= self.limit and \
+            self.waiting >= self.max_waiting
+
+    def acquire(self, timeout):
+        with self._changed:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_waiting:
+                raise UpstreamSaturated("Too many model calls waiting",
+                                        SATURATED_RETRY_AFTER)
+            self.waiting += 1
+            try:
+                acquired = self._changed.wait_for(
+                    lambda: self.in_flight < self.limit, timeout
+                )
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                raise UpstreamSaturated("Timed out waiting for a model call",
+                                        SATURATED_RETRY_AFTER)
+            self.in_flight += 1
+
+    def release(self):
+        with self._changed:
+            self.in_flight -= 1
+            self._changed.notify()
+
+
+class _GuardedStream:
+    """Holds the call's slot until the streamed answer is consumed."""
+
+    def __init__(self, stream, done):
+        self._stream = iter(stream)
+        self._done = done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self._finish(True)
+            raise
+        except Exception as e:
+            self._finish(not is_retryable(e))
+            raise
+
+    def _finish(self, ok):
+        done, self._done = self._done, None
+        if done is not None:
+            done(ok)
+
+    def close(self):
+        # Abandoned by the reader (e.g. a cancelled job): not a failure.
+        self._finish(True)
+        close = getattr(self._stream, 'close', None)
+        if close is not None:
+            close()
+
+    def __del__(self):
+        self._finish(True)
+
+
+class ModelClient:
+    def __init__(self, upstream, config, instrument=None):
+        """
+        Guard ``upstream``, a Groq-compatible client; ``instrument``
+        optionally wraps it for metrics, so each attempt is timed.
+        """
+        self.upstream = upstream
+        self._client = instrument(upstream) if instrument else upstream
+        self.timeout = config['LLM_TIMEOUT']
+        self.queue_timeout = config['LLM_QUEUE_TIMEOUT']
+        self.retries = config['LLM_RETRIES']
+        self.backoff = config['LLM_RETRY_BACKOFF']
+        self.limiter = Limiter(config['LLM_MAX_IN_FLIGHT'],
+                               config['LLM_MAX_WAITING'])
+        self.breaker = CircuitBreaker(
+            window=config['LLM_BREAKER_WINDOW'],
+            min_calls=config['LLM_BREAKER_MIN_CALLS'],
+            error_rate=config['LLM_BREAKER_ERROR_RATE'],
+            slow_seconds=config['LLM_BREAKER_SLOW_SECONDS'],
+            cooldown=config['LLM_BREAKER_COOLDOWN'],
+        )
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create)
+        )
+
+    def retry_after(self):
+        """Seconds to tell clients to wait, 0 when calls are accepted."""
+        retry_after = self.breaker.retry_after()
+        if not retry_after and self.limiter.saturated:
+            retry_after = SATURATED_RETRY_AFTER
+        return retry_after
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads the retries of callers that failed at the
+        # same moment instead of sending them back together.
+        time.sleep(random.uniform(
+            0, min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1))
+        ))
+
+    def create(self, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                self.limiter.acquire(self.queue_timeout)
+            except UpstreamSaturated:
+                if trial:
+                    self.breaker.cancel_trial()
+                raise
+            started = time.monotonic()
+            try:
+                result = self._client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.limiter.release()
+                # A 4xx is the caller's fault: the upstream answered fine.
+                self.breaker.record(not is_retryable(e),
+                                    time.monotonic() - started)
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                self._backoff(attempt)
+                continue
+
+            if kwargs.get('stream'):
+                def done(ok):
+                    self.limiter.release()
+                    self.breaker.record(ok, time.monotonic() - started)
+
+                return _GuardedStream(result, done)
+            self.limiter.release()
+            self.breaker.record(True, time.monotonic() - started)
+            return result
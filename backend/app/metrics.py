@@ -0,0 +1,339 @@
+"""
+Per-request performance instrumentation.
+
+Every request collects the number of SQL statements it ran and their total
+time (from engine events, so replica binds are counted too), the time spent
+serializing JSON and the time spent waiting on the model API. The totals are
+sent back in a ``Server-Timing`` header, which browser dev tools show next to
+the request, and are added to histograms served in the Prometheus text
+format at ``/metrics``.
+
+A request slower than ``SLOW_REQUEST_MS``, or one that ran the same
+statement more than ``N_PLUS_ONE_THRESHOLD`` times, is logged with its
+slowest statements; a statement repeated that often is almost always a lazy
+load inside a loop.
+
+Model calls made by background jobs have no request to report to; they only
+feed the ``llm_request_duration_seconds`` histogram. Histograms live in the
+memory of each worker process, like the job pool.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from flask.json.provider import JSONProvider
+
+# statements kept per request for the slow-request log
+SLOWEST_STATEMENTS = 3
+# longest statement text written to the slow-request log
+MAX_LOGGED_STATEMENT = 300
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label combination."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = \
+                    [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(values, list(counts), total)
+                      for values, (counts, total) in self._series.items()]
+        for values, counts, total in sorted(series):
+            labels = [f'{label}="{_escape(value)}"'
+                      for label, value in zip(self.labels, values)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = ','.join(labels + [f'le="{bound}"'])
+                lines.append(
+                    f"{self.name}_bucket{{{bucket_labels}}} {cumulative}"
+                )
+            series_labels = '{' + ','.join(labels) + '}' if labels else ''
+            lines.append(f"{self.name}_sum{series_labels} {total}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """What one request spent its time on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.llm_seconds = 0.0
+        self.llm_calls = 0
+        # statement text -> times it ran
+        self.statements = {}
+        # min-heap of the (seconds, statement) of the slowest statements
+        self.slowest = []
+
+    def add_query(self, statement, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, (seconds, statement))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, statement))
+
+    def repeated(self, threshold):
+        """Statements that ran more than ``threshold`` times."""
+        return sorted(
+            ((count, statement) for statement, count in self.statements.items()
+             if count > threshold),
+            reverse=True
+        )
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_seconds * 1000:.2f};'
+            f'desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_seconds * 1000:.2f}',
+            f'llm;dur={self.llm_seconds * 1000:.2f};'
+            f'desc="{self.llm_calls} calls"',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def current_request_metrics():
+    """The ``RequestMetrics`` of the current request, if any."""
+    if has_request_context():
+        return g.get('request_metrics')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # Statements on one connection never overlap; a failed one is simply
+    # overwritten by the next.
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    started = conn.info['query_started']
+    request_metrics = current_request_metrics()
+    if request_metrics is not None:
+        request_metrics.add_query(statement, time.perf_counter() - started)
+
+
+class TimedJSONProvider(JSONProvider):
+    """
+    Wraps the installed ``app.json`` to add the time spent encoding to the
+    current request's metrics.
+    """
+
+    def __init__(self, app, provider):
+        super().__init__(app)
+        self.provider = provider
+
+    def _timed(self, encode, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return encode(*args, **kwargs)
+        finally:
+            request_metrics = current_request_metrics()
+            if request_metrics is not None:
+                request_metrics.serialize_seconds += \
+                    time.perf_counter() - started
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(self.provider.dumps, obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return self.provider.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._timed(self.provider.response, *args, **kwargs)
+
+
+class _TimedCompletions:
+    def __init__(self, completions, registry):
+        self._completions = completions
+        self._registry = registry
+
+    def create(self, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            completion = self._completions.create(*args, **kwargs)
+            outcome = 'ok'
+            return completion
+        finally:
+            self._registry.observe_llm(kwargs.get('model', ''), outcome,
+                                       time.perf_counter() - started)
+
+
+class _TimedChat:
+    def __init__(self, chat, registry):
+        self.completions = _TimedCompletions(chat.completions, registry)
+
+
+class TimedLLMClient:
+    """Wraps a Groq-compatible client to time its completion calls."""
+
+    def __init__(self, client, registry):
+        self._client = client
+        self.chat = _TimedChat(client.chat, registry)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class Registry:
+    """The histograms of one application."""
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds',
+            "Time to produce a response.",
+            ('method', 'endpoint', 'status'), LATENCY_BUCKETS)
+        self.request_queries = Histogram(
+            'http_request_db_queries',
+            "SQL statements run per request.",
+            ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.request_sql = Histogram(
+            'http_request_db_seconds',
+            "Time spent in SQL statements per request.",
+            ('endpoint',), LATENCY_BUCKETS)
+        self.request_serialize = Histogram(
+            'http_request_serialize_seconds',
+            "Time spent serializing JSON per request.",
+            ('endpoint',), LATENCY_BUCKETS)
+        self.llm_duration = Histogram(
+            'llm_request_duration_seconds',
+            "Latency of model API calls.",
+            ('model', 'outcome'), LLM_BUCKETS)
+        self.histograms = [self.request_duration, self.request_queries,
+                           self.request_sql, self.request_serialize,
+                           self.llm_duration]
+
+    def observe_request(self, request_metrics, endpoint, method, status,
+                        total):
+        self.request_duration.observe(total, method, endpoint, status)
+        self.request_queries.observe(request_metrics.queries, endpoint)
+        self.request_sql.observe(request_metrics.sql_seconds, endpoint)
+        self.request_serialize.observe(request_metrics.serialize_seconds,
+                                       endpoint)
+
+    def observe_llm(self, model, outcome, seconds):
+        self.llm_duration.observe(seconds, model, outcome)
+        request_metrics = current_request_metrics()
+        if request_metrics is not None:
+            request_metrics.llm_seconds += seconds
+            request_metrics.llm_calls += 1
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _log_slow_request(request_metrics, total, slow, threshold):
+    lines = [
+        f"{'Slow request' if slow else 'Request'} {request.method} "
+        f"{request.full_path}: "
+        f"{total * 1000:.1f} ms, {request_metrics.queries} queries in "
+        f"{request_metrics.sql_seconds * 1000:.1f} ms, serialization "
+        f"{request_metrics.serialize_seconds * 1000:.1f} ms, model calls "
+        f"{request_metrics.llm_seconds * 1000:.1f} ms"
+    ]
+    for count, statement in request_metrics.repeated(threshold):
+        lines.append(f"  possible N+1, ran {count} times: "
+                     f"{statement[:MAX_LOGGED_STATEMENT]}")
+    for seconds, statement in sorted(request_metrics.slowest, reverse=True):
+        lines.append(f"  {seconds * 1000:.1f} ms: "
+                     f"{statement[:MAX_LOGGED_STATEMENT]}")
+    logging.warning('\n'.join(lines))
+
+
+class Metrics:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        registry = app.extensions['metrics'] = Registry()
+        app.json = TimedJSONProvider(app, app.json)
+
+        if not event.contains(Engine, 'before_cursor_execute',
+                              _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute',
+                         _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+
+        @app.before_request
+        def start_request_metrics():
+            g.request_metrics = RequestMetrics()
+
+        @app.after_request
+        def finish_request_metrics(response):
+            request_metrics = g.pop('request_metrics', None)
+            if request_metrics is None:
+                return response
+            total = time.perf_counter() - request_metrics.started
+            if app.config['SERVER_TIMING']:
+                response.headers['Server-Timing'] = \
+                    request_metrics.server_timing(total)
+            registry.observe_request(request_metrics,
+                                     request.endpoint or 'unmatched',
+                                     request.method, response.status_code,
+                                     total)
+
+            slow = total * 1000 > app.config['SLOW_REQUEST_MS']
+            threshold = app.config['N_PLUS_ONE_THRESHOLD']
+            if slow or request_metrics.repeated(threshold):
+                _log_slow_request(request_metrics, total, slow, threshold)
+            return response
+
+        if app.config['METRICS_ENABLED']:
+            app.add_url_rule('/metrics', 'metrics', self.export)
+
+    @property
+    def registry(self):
+        return current_app.extensions['metrics']
+
+    def instrument_llm(self, client):
+        """Return ``client`` with its completion calls timed."""
+        return TimedLLMClient(client, self.registry)
+
+    def export(self):
+        return Response(self.registry.render(),
+                        mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,110 @@
+from app import db
+from app.recipes.units import to_base
+
+# --- ASSOCIATION TABLE ---
+recipe_type_association = db.Table(
+    'recipe_type_association',
+    db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id'),
+              primary_key=True),
+    db.Column('type_id', db.Integer, db.ForeignKey('recipe_type.id'),
+              primary_key=True),
+    db.Index('ix_recipe_type_association_type_id', 'type_id'),
+)
+
+
+# --- RECIPE MODELS ---
+class Recipe(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    source = db.Column(db.String(500))  # URL or text reference
+    steps = db.Column(db.Text, nullable=False)
+    # bumped by every edit, which must name the version it was made from
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    ingredients = db.relationship('RecipeIngredient', back_populates='recipe',
+                                  cascade="all, delete-orphan")
+    types = db.relationship('RecipeType', secondary=recipe_type_association,
+                            back_populates='recipes')
+
+
+class RecipeSignature(db.Model):
+    """MinHash signature of a recipe's ingredients, see app.recipes.similar."""
+    recipe_id = db.Column(db.Integer,
+                          db.ForeignKey('recipe.id', ondelete='CASCADE'),
+                          primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+
+class RecipeDocument(db.Model):
+    """Serialized detail JSON of a recipe, see app.recipes.documents."""
+    recipe_id = db.Column(db.Integer,
+                          db.ForeignKey('recipe.id', ondelete='CASCADE'),
+                          primary_key=True)
+    body = db.Column(db.LargeBinary, nullable=False)
+
+
+class RecipeType(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+    recipes = db.relationship('Recipe', secondary=recipe_type_association,
+                              back_populates='types')
+
+
+# --- INGREDIENT MODELS ---
+class Ingredient(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    category_id = db.Column(db.Integer,
+                            db.ForeignKey('ingredient_category.id'),
+                            nullable=True)
+
+    category = db.relationship('IngredientCategory', backref='ingredients')
+    recipes = db.relationship('RecipeIngredient', back_populates='ingredient',
+                              cascade="all, delete-orphan")
+
+
+# Names are unique regardless of case.
+db.Index('uq_ingredient_name_lower', db.func.lower(Ingredient.name),
+         unique=True)
+
+
+class IngredientCategory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+
+# --- MANY-TO-MANY RELATIONSHIP MODEL ---
+def _base_quantity(context):
+    """Insert default of the canonical quantity, for ORM and Core inserts."""
+    params = context.get_current_parameters()
+    return to_base(params['amount'], params.get('unit'))
+
+
+class RecipeIngredient(db.Model):
+    """
+    Many-to-Many relationship between Recipe and Ingredient.
+    Stores amount and unit for each ingredient.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'),
+                          nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'),
+                              nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    unit = db.Column(db.String(50))
+    # amount converted to the base unit of its dimension (g, ml) or, for
+    # units without a conversion, the normalized unit; see app.recipes.units
+    base_amount = db.Column(db.Float,
+                            default=lambda ctx: _base_quantity(ctx)[0])
+    base_unit = db.Column(db.String(50),
+                          default=lambda ctx: _base_quantity(ctx)[1])
+
+    recipe = db.relationship('Recipe', back_populates='ingredients')
+    ingredient = db.relationship('Ingredient', back_populates='recipes')
+
+    __table_args__ = (
+        db.Index('ix_recipe_ingredient_quantity', 'ingredient_id',
+                 'base_unit', 'base_amount'),
+    )
@@ -0,0 +1,17 @@
+from flask import jsonify, Blueprint
+
+from app import cache
+from app.database import read_only
+from app.models import RecipeType
+
+
+recipe_type_bp = Blueprint('recipe_type', __name__)
+
+
+@recipe_type_bp.route('/')
+@read_only
+@cache.cached('recipe_type')
+def list_types():
+    types = RecipeType.query.all()
+
+    return jsonify({'types': types})
@@ -0,0 +1,180 @@
+"""
+Materialized recipe documents for the detail endpoint.
+
+``recipe_document`` holds, per recipe, the JSON ``GET /api/recipes/<id>``
+answers with, already encoded. A detail view is then a single primary key
+read whose bytes are written out as they are, instead of three queries and
+a serialization per view.
+
+Documents are rewritten in the transaction that changes what they are built
+from: the recipe views and the importer call ``index_recipes`` and
+``remove_recipe`` like they update the search index, and session events
+rewrite the documents of every recipe using an ``Ingredient`` or
+``RecipeType`` that is renamed or deleted, whichever code path does it.
+``flask recipe rebuild-documents`` rebuilds them all, in parallel batches;
+a recipe without a document is still served from the tables.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Ingredient, Recipe, RecipeDocument, RecipeType
+from app.recipes.export import association, ingredients_by_recipe, \
+    recipe, recipe_ingredient, types_by_recipe
+from app.serialization import dumps_json
+
+document = RecipeDocument.__table__.c
+# recipes per IN list when documents are rewritten by id
+BATCH_SIZE = 500
+# recipes per transaction of a full rebuild
+REBUILD_BATCH_SIZE = 2000
+
+
+def _build(connection, where):
+    """The document rows of the recipes whose id meets ``where``."""
+    types = types_by_recipe(connection, where)
+    ingredients = ingredients_by_recipe(connection, where)
+    # Same keys, in the same order, as serializers.sparse_recipe in detail.
+    return [{
+        'recipe_id': recipe_id,
+        'body': dumps_json({
+            'id': recipe_id,
+            'version': version,
+            'name': name,
+            'types': types.get(recipe_id, []),
+            'ingredients': ingredients.get(recipe_id, []),
+            'steps': steps,
+        }),
+    } for recipe_id, version, name, steps in connection.execute(
+        db.select(recipe.id, recipe.version, recipe.name, recipe.steps)
+        .where(where(recipe.id))
+    )]
+
+
+def _store(connection, where):
+    # Built before writing anything, to hold write locks for less time.
+    rows = _build(connection, where)
+    connection.execute(
+        db.delete(RecipeDocument).where(where(document.recipe_id))
+    )
+    if rows:
+        connection.execute(db.insert(RecipeDocument), rows)
+    return len(rows)
+
+
+def _store_ids(connection, recipe_ids):
+    recipe_ids = sorted(recipe_ids)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        _store(connection, lambda recipe_id: recipe_id.in_(batch))
+
+
+def index_recipes(recipe_ids):
+    """
+    Rewrite the documents of recipes that were added or edited.
+
+    Runs inside the caller's transaction, before it commits.
+    """
+    db.session.flush()
+    _store_ids(db.session.connection(), recipe_ids)
+
+
+def index_recipe(recipe_id):
+    index_recipes([recipe_id])
+
+
+def remove_recipe(recipe_id):
+    db.session.execute(db.delete(RecipeDocument).where(
+        RecipeDocument.recipe_id == recipe_id
+    ))
+
+
+def get_document(recipe_id):
+    """The stored JSON of a recipe, ``None`` if it was never built."""
+    return db.session.scalar(
+        db.select(RecipeDocument.body)
+        .where(RecipeDocument.recipe_id == recipe_id)
+    )
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE, workers=4):
+    """
+    Rebuild every document, ``batch_size`` recipes per transaction on
+    ``workers`` threads; returns the number of documents written.
+
+    SQLite runs one writer at a time, so there the batches run one after
+    the other.
+    """
+    app = current_app._get_current_object()
+    if db.engine.dialect.name == 'sqlite':
+        workers = 1
+    db.session.execute(db.delete(RecipeDocument).where(
+        ~document.recipe_id.in_(db.select(recipe.id))
+    ))
+    db.session.commit()
+    recipe_ids = db.session.scalars(
+        db.select(Recipe.id).order_by(Recipe.id)
+    ).all()
+    ranges = [(recipe_ids[start],
+               recipe_ids[min(start + batch_size, len(recipe_ids)) - 1])
+              for start in range(0, len(recipe_ids), batch_size)]
+
+    def rebuild_range(bounds):
+        # Each thread gets its own app context, so its own session and
+        # connection.
+        with app.app_context():
+            first, last = bounds
+            count = _store(db.session.connection(),
+                           lambda recipe_id: recipe_id.between(first, last))
+            db.session.commit()
+            return count
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(rebuild_range, ranges))
+
+
+@event.listens_for(Session, 'before_flush')
+def _find_stale_documents(session, flush_context, instances):
+    # Collected before the flush: once a deleted ingredient or type is
+    # flushed, the rows linking it to its recipes are gone.
+    ingredient_ids, type_ids = set(), set()
+    for obj in session.deleted:
+        if isinstance(obj, Ingredient):
+            ingredient_ids.add(obj.id)
+        elif isinstance(obj, RecipeType):
+            type_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, (Ingredient, RecipeType)) and \
+                inspect(obj).attrs.name.history.has_changes():
+            (ingredient_ids if isinstance(obj, Ingredient)
+             else type_ids).add(obj.id)
+    if not ingredient_ids and not type_ids:
+        return
+
+    connection = session.connection()
+    stale = session.info.setdefault('stale_documents', set())
+    if ingredient_ids:
+        stale.update(connection.scalars(
+            db.select(recipe_ingredient.recipe_id).distinct()
+            .where(recipe_ingredient.ingredient_id.in_(ingredient_ids))
+        ))
+    if type_ids:
+        stale.update(connection.scalars(
+            db.select(association.recipe_id).distinct()
+            .where(association.type_id.in_(type_ids))
+        ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _rewrite_stale_documents(session, flush_context):
+    recipe_ids = session.info.pop('stale_documents', None)
+    if recipe_ids:
+        _store_ids(session.connection(), recipe_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stale_documents(session):
+    session.info.pop('stale_documents', None)
@@ -0,0 +1,418 @@
+"""
+Image to recipe extraction through the Groq chat completion API.
+
+The pipeline has two stages: a vision model reads the text off the photo,
+then a text model turns it into the recipe JSON the form expects. Both go
+through an injectable client so the whole pipeline can run against a fake
+in tests: put any object with a Groq-compatible ``chat.completions.create``
+in ``app.extensions['llm_client']``.
+"""
+import json
+import logging
+import math
+import os
+from base64 import b64encode
+from io import BytesIO
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app import llm, metrics
+from app.recipes import units
+from app.recipes.json_stream import JSONStreamParser
+from app.recipes.extraction_cache import content_key
+
+VISION_MODEL = "llama-3.2-90b-vision-preview"
+STRUCTURING_MODEL = "llama-3.3-70b-versatile"
+OCR_PROMPT = "Extract all text from the image"
+# Part of every cache key; bump it when a change outside the prompt text
+# (sampling parameters, image encoding, ...) alters what the models return.
+PROMPT_VERSION = 1
+
+
+class ExtractionCancelled(Exception):
+    """Raised between stages when the job was cancelled or timed out."""
+
+
+def get_llm_client():
+    """
+    Return the app's guarded ``ModelClient`` around the injected model
+    client, or a Groq client, with each upstream attempt timed.
+    """
+    client = current_app.extensions.get('llm_client')
+    if client is None:
+        from groq import Groq
+
+        # Retries are left to the ModelClient, which knows about the
+        # circuit breaker.
+        client = Groq(api_key=os.getenv("GROQ_API_KEY"),
+                      base_url=current_app.config['GROQ_BASE_URL'],
+                      timeout=current_app.config['LLM_TIMEOUT'],
+                      max_retries=0)
+        current_app.extensions['llm_client'] = client
+    pooled = current_app.extensions.get('model_client')
+    if pooled is None or pooled.upstream is not client:
+        pooled = current_app.extensions['model_client'] = llm.ModelClient(
+            client, current_app.config, instrument=metrics.instrument_llm
+        )
+    return pooled
+
+
+class ImageRejected(ValueError):
+    """The upload is not an image we are willing to decode."""
+
+
+def image_options():
+    """Preprocessing settings of the current app, for use off-request."""
+    config = current_app.config
+    return {
+        'max_edge': config['IMAGE_MAX_EDGE'],
+        'max_pixels': config['IMAGE_MAX_PIXELS'],
+        'grayscale': config['IMAGE_GRAYSCALE'],
+        'quality': config['IMAGE_JPEG_QUALITY'],
+    }
+
+
+def open_image(image_bytes, options):
+    """
+    Open an upload and prepare it to be decoded at the smallest useful size.
+
+    Only the header is read here. JPEGs are switched to draft mode so the
+    decoder scales them down by up to 8x (and to grayscale) while decoding;
+    the pixel count that will actually be decoded is then checked against
+    ``max_pixels``, which caps the memory a request can take and rejects
+    decompression bombs before any pixel data is touched.
+    """
+    try:
+        image = Image.open(BytesIO(image_bytes))
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ImageRejected(str(e))
+
+    if image.format == 'JPEG':
+        scale = min(1, options['max_edge'] / max(image.size))
+        image.draft('L' if options['grayscale'] else 'RGB',
+                    (math.ceil(image.size[0] * scale),
+                     math.ceil(image.size[1] * scale)))
+
+    width, height = image.size
+    if width * height > options['max_pixels']:
+        raise ImageRejected(
+            f"Image is too large ({width}x{height} pixels to decode)"
+        )
+    return image
+
+
+def encode_image(image_bytes, options):
+    """
+    Return the upload as a small base64 JPEG tuned for OCR.
+
+    The image is turned upright from its EXIF orientation, shrunk to
+    ``max_edge`` and, unless disabled, converted to contrast-stretched
+    grayscale.
+    """
+    image = open_image(image_bytes, options)
+    decoded = image.size[0] * image.size[1] * len(image.getbands())
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    image.thumbnail((options['max_edge'], options['max_edge']),
+                    reducing_gap=2.0)
+    if options['grayscale']:
+        image = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+
+    buffered = BytesIO()
+    image.save(buffered, format='JPEG', quality=options['quality'],
+               optimize=True)
+    logging.info(
+        f"Image preprocessed: {len(image_bytes)} bytes uploaded, "
+        f"{decoded} bytes decoded, {buffered.tell()} bytes sent"
+    )
+    return b64encode(buffered.getbuffer()).decode()
+
+
+def json_prompt(recipe_text, recipe_types_list):
+    json_output = {
+        "recipe": {
+            'name': "",
+            'types': [{
+                "id": "",
+                "name": ""
+            }],
+            "ingredients": [{
+                "name": "",
+                "amount": "",
+                "unit": ""
+            }],
+            'steps': "",
+        },
+    }
+
+    return (
+        f"Take the context and convert it into JSON following these guidelines:\n\n"
+        f"Context: {recipe_text}"
+        f"1. Recipe Types:\n"
+        f"   - Identify the recipe type from the image and ensure that it is one of the allowed types: {recipe_types_list}.\n"
+        f"   - If the extracted recipe type does not directly match any of the allowed types, select the most appropriate type from the allowed list instead of skipping.\n\n"
+        f"2. Name: \n"
+        f"   - Name should be capitalized.\n"
+        f"3. Steps:\n"
+        f"   - Split the recipe steps into individual paragraphs using the newline character ('\\n') as a delimiter.\n\n"
+        f"4. Ingredients:\n"
+        f"   - For each ingredient, extract the ingredient name, the amount, and the unit.\n"
+        f"   - The amount must contain only a numerical value in standard decimal format (e.g., '0.5' instead of '1/2'), with no units or fractions included.\n"
+        f"   - If unit is missing, represent it as an empty string, ingredient name and amount are mandatory.\n\n"
+        f"5. Final Output:\n"
+        f"   - Use the following JSON structure exactly:\n{json.dumps(json_output)}\n"
+        f"   - Ensure that the output is valid JSON.\n"
+    )
+
+
+def _ocr_messages(image_base64):
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": OCR_PROMPT
+                },
+                {
+                    "type": "image_url", "image_url":
+                    {
+                        "url": f"data:image/jpeg;base64,{image_base64}"
+                    }
+                }
+
+            ]
+        }
+    ]
+
+
+def extract_text(client, image_base64):
+    """Read all text off the image with the vision model."""
+    completion = client.chat.completions.create(
+        model=VISION_MODEL,
+        messages=_ocr_messages(image_base64),
+        temperature=1,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=False,
+        stop=None
+    )
+    return completion.choices[0].message.content
+
+
+def _deltas(stream):
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_text(client, image_base64, on_token):
+    """``extract_text``, passing every piece of text to ``on_token``."""
+    stream = client.chat.completions.create(
+        model=VISION_MODEL,
+        messages=_ocr_messages(image_base64),
+        temperature=1,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=True,
+        stop=None
+    )
+    parts = []
+    for delta in _deltas(stream):
+        parts.append(delta)
+        on_token(delta)
+    return ''.join(parts)
+
+
+def structure_recipe(client, prompt):
+    """Turn the extracted text into the recipe JSON."""
+    completion = client.chat.completions.create(
+        model=STRUCTURING_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=1,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=False,
+        stop=None,
+        response_format={"type": "json_object"},
+    )
+    return json.loads(completion.choices[0].message.content)
+
+
+def _streamed_field(path):
+    return path in (('recipe', 'name'), ('recipe', 'types'),
+                    ('recipe', 'steps')) or \
+        (len(path) == 3 and path[:2] == ('recipe', 'ingredients'))
+
+
+def stream_recipe(client, prompt, on_field):
+    """
+    ``structure_recipe``, calling ``on_field(path, value)`` as soon as the
+    name, the types, each ingredient and the steps are complete.
+
+    JSON mode cannot be streamed, so the document is picked out of the
+    free-form answer instead.
+    """
+    stream = client.chat.completions.create(
+        model=STRUCTURING_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=1,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=True,
+        stop=None,
+    )
+    parser = JSONStreamParser(_streamed_field)
+    for delta in _deltas(stream):
+        for path, value in parser.feed(delta):
+            on_field(path, value)
+        if parser.done:
+            break
+    if not isinstance(parser.document, dict):
+        raise ValueError("The model did not answer with a JSON recipe")
+    return parser.document
+
+
+def _add_base_units(ingredient):
+    try:
+        amount = units.parse_amount(ingredient.get('amount'))
+    except ValueError:
+        ingredient['base_amount'] = ingredient['base_unit'] = None
+        return ingredient
+    ingredient['base_amount'], ingredient['base_unit'] = units.to_base(
+        amount, ingredient.get('unit')
+    )
+    return ingredient
+
+
+def with_base_units(recipe):
+    """
+    Add the canonical ``base_amount``/``base_unit`` to every ingredient of
+    an extracted recipe, both ``None`` when the amount is not a number.
+    """
+    ingredients = (recipe.get('recipe') or {}).get('ingredients') or []
+    for ingredient in ingredients:
+        if isinstance(ingredient, dict):
+            _add_base_units(ingredient)
+    return recipe
+
+
+def _text_key(image_bytes, options):
+    return content_key('text', str(PROMPT_VERSION), VISION_MODEL, OCR_PROMPT,
+                       json.dumps(options, sort_keys=True), image_bytes)
+
+
+def _recipe_key(prompt):
+    return content_key('recipe', str(PROMPT_VERSION), STRUCTURING_MODEL,
+                       prompt)
+
+
+def cached_recipe(cache, image_bytes, options, recipe_types_list):
+    """Return the result for an image if both stages are cached."""
+    if cache is None:
+        return None
+    recipe_text = cache.get(_text_key(image_bytes, options))
+    if recipe_text is None:
+        return None
+    recipe = cache.get(_recipe_key(json_prompt(recipe_text,
+                                               recipe_types_list)))
+    if recipe is None:
+        return None
+    return dict(with_base_units(recipe),
+                cached={'text': True, 'recipe': True})
+
+
+def upload_key(image_bytes, options, recipe_types_list):
+    """Identifies uploads whose extraction would be exactly the same."""
+    return content_key('upload', _text_key(image_bytes, options),
+                       json.dumps(recipe_types_list, sort_keys=True))
+
+
+def _field_event(path, value):
+    """The server-sent event for a completed field of the recipe."""
+    if path[1] == 'ingredients':
+        if isinstance(value, dict):
+            value = _add_base_units(value)
+        return 'ingredient', {'index': path[2], 'ingredient': value}
+    return path[1], {path[1]: value}
+
+
+def extract_recipe(client, image_bytes, options, recipe_types_list,
+                   should_stop=lambda: False, cache=None, emit=None):
+    """
+    Run the whole pipeline for one uploaded image.
+
+    ``options`` are the preprocessing settings from ``image_options``.
+    With a ``cache``, the OCR text is looked up by the image bytes and the
+    recipe by the structuring prompt, so a new prompt only repeats the
+    second call. The result's ``cached`` entry tells which stages hit.
+    ``should_stop`` is checked between stages so a cancelled or timed out
+    job does not pay for the second model call.
+
+    With ``emit``, both completions are streamed and progress is reported
+    as it happens through ``emit(event, data)``: ``stage`` when a stage
+    starts, ``ocr_token`` for each piece of OCR text, ``ocr`` with the
+    whole text, then ``name``, ``types``, ``ingredient`` and ``steps`` as
+    each is complete in the structuring output.
+    """
+    cached = {'text': False, 'recipe': False}
+
+    def on_token(text):
+        if should_stop():
+            raise ExtractionCancelled()
+        emit('ocr_token', {'text': text})
+
+    def on_field(path, value):
+        if should_stop():
+            raise ExtractionCancelled()
+        emit(*_field_event(path, value))
+
+    if emit is not None:
+        emit('stage', {'stage': 'ocr'})
+    text_key = _text_key(image_bytes, options)
+    recipe_text = cache.get(text_key) if cache is not None else None
+    if recipe_text is not None:
+        cached['text'] = True
+    else:
+        image_base64 = encode_image(image_bytes, options)
+        if should_stop():
+            raise ExtractionCancelled()
+        if emit is not None:
+            recipe_text = stream_text(client, image_base64, on_token)
+        else:
+            recipe_text = extract_text(client, image_base64)
+        if cache is not None:
+            cache.set(text_key, recipe_text)
+    if should_stop():
+        raise ExtractionCancelled()
+
+    prompt = json_prompt(recipe_text, recipe_types_list)
+    if emit is not None:
+        emit('ocr', {'text': recipe_text, 'cached': cached['text']})
+        emit('stage', {'stage': 'structuring'})
+    recipe_key = _recipe_key(prompt)
+    recipe = cache.get(recipe_key) if cache is not None else None
+    if recipe is not None:
+        cached['recipe'] = True
+    else:
+        if emit is not None:
+            recipe = stream_recipe(client, prompt, on_field)
+        else:
+            recipe = structure_recipe(client, prompt)
+        if cache is not None:
+            cache.set(recipe_key, recipe)
+
+    return dict(with_base_units(recipe), cached=cached)
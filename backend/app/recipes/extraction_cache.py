@@ -0,0 +1,105 @@
+"""
+Persistent cache for image extraction results.
+
+Entries are content addressed: the caller hashes everything that decides
+the model output (input bytes or text, model name, prompt) into the key, so
+an entry never has to be invalidated, only evicted. Eviction drops entries
+older than ``ttl`` seconds and, once the file holds more than ``max_bytes``
+of values, the least recently used ones.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from hashlib import sha256
+
+from flask import current_app
+
+
+def content_key(*parts):
+    """Hash ``parts`` (bytes or str) into a cache key."""
+    digest = sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(sha256(part).digest())
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entry "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created REAL NOT NULL, "
+            "used REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_entry_used ON entry (used)"
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """Return the cached JSON value for ``key`` or ``None``."""
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value FROM entry WHERE key = ? AND created > ?",
+            (key, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE entry SET used = ? WHERE key = ?", (now, key)
+        )
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        value = json.dumps(value)
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now)
+            )
+            connection.execute(
+                "DELETE FROM entry WHERE created <= ?", (now - self.ttl,)
+            )
+            # Drop least recently used entries until the total fits.
+            connection.execute(
+                "DELETE FROM entry WHERE key IN ("
+                "SELECT key FROM (SELECT key, sum(size) OVER "
+                "(ORDER BY used DESC, key) AS total FROM entry) "
+                "WHERE total > ?)",
+                (self.max_bytes,)
+            )
+
+
+def get_extraction_cache():
+    """Return the extraction cache of the current app, if it is enabled."""
+    if not current_app.config['EXTRACTION_CACHE_PATH']:
+        return None
+    if 'extraction_cache' not in current_app.extensions:
+        current_app.extensions['extraction_cache'] = ExtractionCache(
+            current_app.config['EXTRACTION_CACHE_PATH'],
+            current_app.config['EXTRACTION_CACHE_MAX_BYTES'],
+            current_app.config['EXTRACTION_CACHE_TTL'],
+        )
+    return current_app.extensions['extraction_cache']
@@ -0,0 +1,272 @@
+"""
+Bulk recipe import from a streamed NDJSON or JSON array body.
+
+Records are parsed one at a time straight from the request stream and
+written in batches: each batch resolves its ingredients by normalized name
+with one query, creates the missing ones, and bulk inserts recipes,
+``recipe_ingredient`` and ``recipe_type_association`` rows before
+committing. Memory use therefore depends on the batch size, not on the
+size of the upload.
+
+Each record looks like::
+
+    {"name": "...", "steps": "...", "source": "...",
+     "types": [1, "Dessert"],
+     "ingredients": [{"name": "flour", "amount": 200, "unit": "g"}]}
+"""
+import codecs
+import json
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.ingredients.suggest import normalize
+from app.models import Ingredient, Recipe, RecipeIngredient, RecipeType, \
+    recipe_type_association
+from app.recipes import documents, search as recipe_search, similar
+from app.recipes.units import parse_amount
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported."""
+
+
+def iter_documents(stream):
+    """
+    Yield ``(line, document)`` pairs from an NDJSON or JSON array stream.
+
+    ``line`` is the line number for NDJSON and the element number for an
+    array. A document that cannot be parsed is yielded as a
+    ``RecordError``; NDJSON carries on with the next line, an array stops
+    since there is no way to find the next element.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    eof = False
+    is_array = None
+    count = 0
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            buffer += decoder.decode(b'', final=True)
+        else:
+            buffer += decoder.decode(chunk)
+
+    while True:
+        if is_array is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                if eof:
+                    return
+                fill()
+                continue
+            is_array = stripped[0] == '['
+            buffer = stripped[1:] if is_array else buffer
+
+        if is_array:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                document, end = _decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    if buffer:
+                        yield count + 1, RecordError(f"Invalid JSON: {e}")
+                    return
+                fill()
+                continue
+            # A bare number may have been cut at the chunk boundary.
+            if end == len(buffer) and not eof and \
+                    not isinstance(document, (dict, list)):
+                fill()
+                continue
+            count += 1
+            buffer = buffer[end:]
+            yield count, document
+        else:
+            newline = buffer.find('\n')
+            if newline == -1 and not eof:
+                fill()
+                continue
+            if newline == -1:
+                line, buffer = buffer, ''
+            else:
+                line, buffer = buffer[:newline], buffer[newline + 1:]
+            count += 1
+            if line.strip():
+                try:
+                    yield count, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield count, RecordError(f"Invalid JSON: {e}")
+            if eof and not buffer:
+                return
+
+
+def _parse_record(record, type_map):
+    if not isinstance(record, dict):
+        raise RecordError("Record must be a JSON object")
+    if not record.get("name") or not record.get("steps") or not record.get(
+            "ingredients"):
+        raise RecordError("Recipe name, steps, and ingredients are required")
+    for field in ("name", "steps", "source"):
+        if record.get(field) is not None and \
+                not isinstance(record[field], str):
+            raise RecordError(f"Recipe {field} must be a string")
+    if not isinstance(record.get("types") or [], list):
+        raise RecordError("Recipe types must be a list")
+    if not isinstance(record["ingredients"], list):
+        raise RecordError("Recipe ingredients must be a list")
+
+    type_ids = []
+    for value in record.get("types") or []:
+        if not isinstance(value, (int, str)) or isinstance(value, bool):
+            raise RecordError(f"Invalid recipe type {value!r}")
+        key = value.lower() if isinstance(value, str) else value
+        if key not in type_map:
+            raise RecordError(f"Unknown recipe type {value!r}")
+        type_ids.append(type_map[key])
+
+    ingredients = []
+    for ingredient_data in record["ingredients"]:
+        if not isinstance(ingredient_data, dict):
+            raise RecordError("Ingredient must be a JSON object")
+        name = ingredient_data.get("name")
+        if not isinstance(name, str) or not normalize(name):
+            raise RecordError("Ingredient name is required")
+        name = normalize(name)
+        unit = ingredient_data.get("unit") or ''
+        if not isinstance(unit, str):
+            raise RecordError(f"Invalid unit for ingredient '{name}'")
+        try:
+            amount = parse_amount(ingredient_data.get("amount"))
+        except ValueError:
+            raise RecordError(f"Invalid amount for ingredient '{name}'")
+        ingredients.append((name, amount, unit))
+
+    return {
+        'name': record["name"],
+        'steps': record["steps"],
+        'source': record.get("source") or '',
+        'type_ids': list(dict.fromkeys(type_ids)),
+        'ingredients': ingredients,
+    }
+
+
+def _resolve_ingredients(names):
+    """Map normalized names to ingredient ids, creating the missing ones."""
+    ids = dict(db.session.execute(
+        db.select(func.lower(Ingredient.name), func.min(Ingredient.id))
+        .where(func.lower(Ingredient.name).in_(names))
+        .group_by(func.lower(Ingredient.name))
+    ).tuples().all())
+
+    missing = [name for name in names if name not in ids]
+    created = []
+    if missing:
+        created = db.session.execute(
+            db.insert(Ingredient).returning(
+                Ingredient.id, Ingredient.name, sort_by_parameter_order=True
+            ),
+            [{'name': name} for name in missing]
+        ).tuples().all()
+        ids.update((name, ingredient_id) for ingredient_id, name in created)
+    return ids, created
+
+
+def _write_batch(batch):
+    """Insert one batch of parsed records and return their recipe ids."""
+    names = list(dict.fromkeys(
+        name for _, record in batch for name, _, _ in record['ingredients']
+    ))
+    ingredient_ids, created = _resolve_ingredients(names)
+
+    recipe_ids = db.session.scalars(
+        db.insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True),
+        [{
+            'name': record['name'],
+            'steps': record['steps'],
+            'source': record['source'],
+        } for _, record in batch]
+    ).all()
+
+    ingredient_rows, type_rows = [], []
+    for recipe_id, (_, record) in zip(recipe_ids, batch):
+        ingredient_rows.extend({
+            'recipe_id': recipe_id,
+            'ingredient_id': ingredient_ids[name],
+            'amount': amount,
+            'unit': unit,
+        } for name, amount, unit in record['ingredients'])
+        type_rows.extend({
+            'recipe_id': recipe_id,
+            'type_id': type_id,
+        } for type_id in record['type_ids'])
+
+    db.session.execute(db.insert(RecipeIngredient), ingredient_rows)
+    if type_rows:
+        db.session.execute(recipe_type_association.insert(), type_rows)
+    recipe_search.index_recipes(recipe_ids)
+    similar.index_recipes(recipe_ids)
+    documents.index_recipes(recipe_ids)
+    return recipe_ids, created
+
+
+def import_recipes(stream, batch_size, summary, on_commit=None):
+    """
+    Import every record of ``stream``, yielding one result per record.
+
+    Results are ``{"line": n, "recipe_id": id}`` or
+    ``{"line": n, "error": "..."}``. ``summary`` is updated in place with the
+    running totals and ``on_commit(created_ingredients)`` is called after
+    every committed batch.
+    """
+    type_map = {}
+    for type_id, name in db.session.query(RecipeType.id, RecipeType.name):
+        type_map[type_id] = type_id
+        type_map[name.lower()] = type_id
+
+    def flush(batch):
+        try:
+            recipe_ids, created = _write_batch(batch)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logging.error(f"Error importing recipes: {e}")
+            summary['failed'] += len(batch)
+            return [{"line": line, "error": str(getattr(e, 'orig', e))}
+                    for line, _ in batch]
+
+        summary['imported'] += len(recipe_ids)
+        summary['ingredients_created'] += len(created)
+        if on_commit is not None:
+            on_commit(created)
+        return [{"line": line, "recipe_id": recipe_id}
+                for (line, _), recipe_id in zip(batch, recipe_ids)]
+
+    batch = []
+    for line, document in iter_documents(stream):
+        try:
+            if isinstance(document, RecordError):
+                raise document
+            batch.append((line, _parse_record(document, type_map)))
+        except RecordError as e:
+            summary['failed'] += 1
+            yield {"line": line, "error": str(e)}
+            continue
+
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+
+    if batch:
+        yield from flush(batch)
@@ -0,0 +1,126 @@
+"""
+Incremental JSON parsing for model output that arrives in chunks.
+
+``JSONStreamParser`` is fed the text as it streams in and reports every
+value whose path is watched as soon as its closing character has arrived,
+long before the document is complete. Paths are tuples of object keys and
+array indexes from the root, e.g. ``('recipe', 'ingredients', 2)``.
+
+Anything before the first ``{`` or ``[`` (a sentence, a code fence) is
+skipped, since models do not always answer with bare JSON.
+"""
+import json
+
+_WHITESPACE = ' \t\r\n'
+_SCALAR_END = ',:}]' + _WHITESPACE
+
+
+class _Frame:
+    __slots__ = ('is_object', 'key', 'start', 'expecting_key')
+
+    def __init__(self, is_object, start):
+        self.is_object = is_object
+        self.key = None if is_object else 0
+        self.start = start
+        self.expecting_key = is_object
+
+
+class JSONStreamParser:
+    def __init__(self, watch):
+        """``watch(path)`` tells whether values at ``path`` are reported."""
+        self.watch = watch
+        self.text = ''
+        self.document = None
+        self._pos = 0
+        self._stack = []
+        self._started = False
+        # start of the string or scalar being read, if any
+        self._token_start = None
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self):
+        return self.document is not None
+
+    def _path(self):
+        return tuple(frame.key for frame in self._stack)
+
+    def _value(self, start, end):
+        """A value ended at ``end``; returns ``(path, value)`` if watched."""
+        path = self._path()
+        if not self._stack:
+            self.document = json.loads(self.text[start:end])
+            return (path, self.document) if self.watch(path) else None
+        if self.watch(path):
+            return path, json.loads(self.text[start:end])
+        return None
+
+    def feed(self, chunk):
+        """Add the next piece of text; returns the completed watched values."""
+        self.text += chunk
+        text = self.text
+        events = []
+        i = self._pos
+        while i < len(text) and not self.done:
+            c = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    start, self._token_start = self._token_start, None
+                    frame = self._stack[-1] if self._stack else None
+                    if frame is not None and frame.expecting_key:
+                        frame.key = json.loads(text[start:i + 1])
+                        frame.expecting_key = False
+                    else:
+                        event = self._value(start, i + 1)
+                        if event:
+                            events.append(event)
+                i += 1
+                continue
+
+            if self._token_start is not None:
+                # Inside a number, true, false or null.
+                if c not in _SCALAR_END:
+                    i += 1
+                    continue
+                start, self._token_start = self._token_start, None
+                event = self._value(start, i)
+                if event:
+                    events.append(event)
+                continue
+
+            if not self._started:
+                if c in '{[':
+                    self._started = True
+                else:
+                    i += 1
+                    continue
+
+            if c in _WHITESPACE or c == ':':
+                pass
+            elif c == '"':
+                self._in_string = True
+                self._token_start = i
+            elif c in '{[':
+                self._stack.append(_Frame(c == '{', i))
+            elif c in '}]':
+                frame = self._stack.pop()
+                event = self._value(frame.start, i + 1)
+                if event:
+                    events.append(event)
+            elif c == ',':
+                frame = self._stack[-1]
+                if frame.is_object:
+                    frame.expecting_key = True
+                else:
+                    frame.key += 1
+            else:
+                self._token_start = i
+            i += 1
+        self._pos = i
+        return events
@@ -0,0 +1,185 @@
+"""
+In-memory inverted index used to answer "what can I cook?" queries.
+
+The index maps every ``Ingredient.id`` to the sorted ids of the recipes that
+use it, so matching a pantry only touches the postings of the ingredients the
+user actually has instead of scanning ``recipe_ingredient``.
+
+Writes handled by this worker update the index in place; before answering,
+the index rebuilds when the ``recipe`` version moved on without it, after a
+write made by another worker.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from flask import current_app
+
+from app import db
+from app.cache import TableWatch
+from app.models import RecipeIngredient, recipe_type_association
+
+
+class PantryIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._watch = TableWatch('recipe')
+        # ingredient id -> sorted array of recipe ids
+        self._postings = {}
+        # recipe id -> ingredient ids / type ids of that recipe
+        self._ingredients = {}
+        self._sizes = {}
+        self._types = {}
+
+    def _load(self, recipe_id=None):
+        """Read (recipe_id, ingredient_id) and (recipe_id, type_id) pairs."""
+        ingredient_query = db.session.query(
+            RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id
+        )
+        type_query = db.session.query(
+            recipe_type_association.c.recipe_id,
+            recipe_type_association.c.type_id
+        )
+        if recipe_id is not None:
+            ingredient_query = ingredient_query.filter(
+                RecipeIngredient.recipe_id == recipe_id
+            )
+            type_query = type_query.filter(
+                recipe_type_association.c.recipe_id == recipe_id
+            )
+
+        ingredients, types = {}, {}
+        for rid, ingredient_id in ingredient_query:
+            ingredients.setdefault(rid, set()).add(ingredient_id)
+        for rid, type_id in type_query:
+            types.setdefault(rid, set()).add(type_id)
+        return ingredients, types
+
+    def _build(self):
+        ingredients, types = self._load()
+        postings = {}
+        for rid in sorted(ingredients):
+            for ingredient_id in ingredients[rid]:
+                postings.setdefault(ingredient_id, array('l')).append(rid)
+
+        self._postings = postings
+        self._ingredients = {
+            rid: frozenset(ids) for rid, ids in ingredients.items()
+        }
+        self._sizes = {rid: len(ids) for rid, ids in ingredients.items()}
+        self._types = {rid: frozenset(ids) for rid, ids in types.items()}
+        self._built = True
+
+    def _ensure_built(self):
+        if self._watch.changed() or not self._built:
+            self._build()
+
+    def _discard(self, recipe_id):
+        self._sizes.pop(recipe_id, None)
+        for ingredient_id in self._ingredients.pop(recipe_id, ()):
+            posting = self._postings[ingredient_id]
+            i = bisect_left(posting, recipe_id)
+            if i < len(posting) and posting[i] == recipe_id:
+                del posting[i]
+            if not posting:
+                del self._postings[ingredient_id]
+        self._types.pop(recipe_id, None)
+
+    def _clear(self):
+        self._built = False
+        self._postings, self._ingredients = {}, {}
+        self._sizes, self._types = {}, {}
+
+    def _follow(self):
+        """Whether a write of this worker can be applied in place."""
+        if self._built and not self._watch.follow():
+            self._clear()
+        return self._built
+
+    def invalidate(self):
+        """Forget everything; the next query rebuilds the index."""
+        with self._lock:
+            self._clear()
+
+    def refresh(self, recipe_id):
+        """Re-read a single recipe after it was added or edited."""
+        with self._lock:
+            if not self._follow():
+                return
+            ingredients, types = self._load(recipe_id)
+            self._discard(recipe_id)
+            ingredient_ids = ingredients.get(recipe_id)
+            if not ingredient_ids:
+                return
+            for ingredient_id in ingredient_ids:
+                insort(
+                    self._postings.setdefault(ingredient_id, array('l')),
+                    recipe_id
+                )
+            self._ingredients[recipe_id] = frozenset(ingredient_ids)
+            self._sizes[recipe_id] = len(ingredient_ids)
+            self._types[recipe_id] = frozenset(types.get(recipe_id, ()))
+
+    def remove(self, recipe_id):
+        """Drop a deleted recipe from the index."""
+        with self._lock:
+            if self._follow():
+                self._discard(recipe_id)
+
+    def match(self, pantry, type_ids=None, max_missing=None, limit=20):
+        """
+        Rank recipes that share at least one ingredient with ``pantry``.
+
+        Recipes are ordered by the share of their ingredients covered by the
+        pantry, then by the number of missing ingredients. Returns a list of
+        ``(recipe_id, coverage, missing_ingredient_ids)`` tuples.
+        """
+        pantry = set(pantry)
+        type_ids = set(type_ids or ())
+
+        with self._lock:
+            self._ensure_built()
+            hits = Counter(chain.from_iterable(
+                self._postings.get(ingredient_id, ())
+                for ingredient_id in pantry
+            ))
+
+            sizes = self._sizes
+            rids = list(hits)
+            if max_missing is not None:
+                rids = [r for r in rids if sizes[r] - hits[r] <= max_missing]
+            if type_ids:
+                types = self._types
+                rids = [
+                    r for r in rids
+                    if not type_ids.isdisjoint(types.get(r, ()))
+                ]
+            if not rids:
+                return []
+
+            # Rank on a bare float first and only build sort tuples for the
+            # few recipes that can make the cut; allocating a tuple per
+            # candidate dominates the cost for very common ingredients.
+            keys = [1 - hits[r] / sizes[r] for r in rids]
+            cutoff = heapq.nsmallest(limit, keys)[-1]
+            best = sorted(
+                (key, sizes[r] - hits[r], r)
+                for key, r in zip(keys, rids) if key <= cutoff
+            )[:limit]
+            return [
+                (
+                    rid,
+                    hits[rid] / sizes[rid],
+                    sorted(self._ingredients[rid] - pantry)
+                )
+                for _, _, rid in best
+            ]
+
+
+def get_pantry_index():
+    """Return the pantry index of the current application."""
+    return current_app.extensions.setdefault('pantry_index', PantryIndex())
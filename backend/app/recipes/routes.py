@@ -0,0 +1,898 @@
+import json
+import logging
+import math
+import time
+from functools import partial
+
+import click
+from flask import current_app, jsonify, Blueprint, request, Response, \
+    stream_with_context, url_for
+from dotenv import load_dotenv
+from app import cache, db, jobs, serializers
+from app.database import read_only
+from app.ingredients.suggest import get_suggest_index
+from app.models import Recipe, RecipeType, Ingredient, RecipeIngredient, \
+    recipe_type_association
+from app.jobs import JobQueueFull
+from app.recipes import documents, export, extraction, importer, shopping, \
+    similar, units, search as recipe_search
+from app.recipes.extraction_cache import get_extraction_cache
+from app.recipes.pantry import get_pantry_index
+from app.recipes.similar import get_similar_index
+from app.serialization import JSON, dumps_json, negotiate
+from app.streaming import STREAM_FORMATS, streamed_response
+
+load_dotenv()
+recipe_bp = Blueprint('recipe', __name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_IMPORT_BATCH_SIZE = 5000
+MAX_SHOPPING_LIST_RECIPES = 200
+DEFAULT_SIMILAR = 10
+# rows fetched per round-trip when streaming a collection
+STREAM_BATCH_SIZE = 500
+# comment lines keeping an idle event stream open through proxies
+SSE_KEEPALIVE_SECONDS = 15
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+# recipe columns an edit may change
+EDITABLE_COLUMNS = ('name', 'source', 'steps')
+
+
+def _parse_names(name, allowed):
+    """
+    Read a comma separated subset of ``allowed`` from the query string,
+    all of them when the parameter is missing.
+    """
+    if name not in request.args:
+        return allowed
+    names = tuple(value.strip() for value in request.args[name].split(',')
+                  if value.strip())
+    if any(value not in allowed for value in names):
+        raise ValueError(f"'{name}' accepts {', '.join(allowed)}")
+    return names
+
+
+def _parse_fieldset():
+    """The recipe ``fields`` (columns) and ``include`` (relationships)."""
+    columns = _parse_names('fields', ('id',) + serializers.RECIPE_COLUMNS)
+    relationships = _parse_names('include',
+                                 serializers.RECIPE_RELATIONSHIPS)
+    return columns, relationships
+
+
+def _is_full(columns, relationships):
+    return set(columns) >= set(serializers.RECIPE_COLUMNS) and \
+        set(relationships) >= set(serializers.RECIPE_RELATIONSHIPS)
+
+
+def _parse_ids(name):
+    """Read a comma separated list of ids from the query string."""
+    return [
+        int(value)
+        for value in request.args.get(name, '').split(',')
+        if value.strip()
+    ]
+
+
+def _read_image_upload():
+    """
+    Validate the uploaded image; returns ``((image_bytes, options,
+    recipe_types_list), None)`` or ``(None, error_response)``.
+    """
+    request.max_content_length = current_app.config['IMAGE_MAX_UPLOAD_BYTES']
+    if 'image' not in request.files:
+        return None, (jsonify({"error": "No image uploaded"}), 400)
+
+    image_bytes = request.files['image'].read()
+    options = extraction.image_options()
+    try:
+        extraction.open_image(image_bytes, options)
+    except extraction.ImageRejected as e:
+        return None, (jsonify({"error": f"Invalid image: {e}"}), 400)
+
+    recipe_types = RecipeType.query.all()
+    recipe_types_list = [{"id": rt.id, "name": rt.name} for rt in recipe_types]
+    return (image_bytes, options, recipe_types_list), None
+
+
+def _queue_full():
+    return jsonify(
+        {"error": "Too many images are being processed, retry later"}
+    ), 503, {'Retry-After': '5'}
+
+
+def _upstream_unavailable(retry_after):
+    return jsonify(
+        {"error": "The recognition service is unavailable, retry later"}
+    ), 503, {'Retry-After': str(math.ceil(retry_after))}
+
+
+@recipe_bp.route('/process-image', methods=['POST'])
+def add_with_image():
+    """
+    Queue the extraction of a recipe from an uploaded photo.
+
+    Answers 202 with the job to poll at the ``Location`` URL, 200 with an
+    already finished job when the image was extracted before, or 503 when
+    the extraction pool or the model API is saturated or failing. An
+    upload identical to one still being extracted gets that same job.
+    """
+    upload, error = _read_image_upload()
+    if error is not None:
+        return error
+    image_bytes, options, recipe_types_list = upload
+    extraction_cache = get_extraction_cache()
+
+    result = extraction.cached_recipe(extraction_cache, image_bytes, options,
+                                      recipe_types_list)
+    if result is not None:
+        return jsonify({"job": jobs.done(result).to_dict()}), 200
+
+    client = extraction.get_llm_client()
+    retry_after = client.retry_after()
+    if retry_after:
+        return _upstream_unavailable(retry_after)
+
+    def run(job):
+        return extraction.extract_recipe(
+            client, image_bytes, options, recipe_types_list, job.should_stop,
+            cache=extraction_cache
+        )
+
+    try:
+        job = jobs.submit(run, key=extraction.upload_key(
+            image_bytes, options, recipe_types_list))
+    except JobQueueFull:
+        return _queue_full()
+
+    return jsonify({"job": job.to_dict()}), 202, {
+        'Location': url_for('recipe.image_job', job_id=job.id)
+    }
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {dumps_json(data).decode()}\n\n"
+
+
+@recipe_bp.route('/process-image/stream', methods=['POST'])
+def stream_image():
+    """
+    Extract a recipe from an uploaded photo, reporting progress as
+    server-sent events.
+
+    The extraction runs as a job, exactly like ``/process-image``, and the
+    response streams what it produces: ``accepted`` with the job, ``stage``
+    events, ``ocr_token`` for each piece of OCR text as the model writes
+    it, ``ocr`` with the whole text, ``name``, ``types``, one
+    ``ingredient`` per ingredient and ``steps`` as soon as each is complete
+    in the structuring output, and finally ``result`` (the same body a
+    finished job has) or ``error``. Identical uploads share one job, and
+    a stream joining it late replays what was already sent; the job is
+    cancelled when the last stream following it is closed. Progress is
+    only reported for jobs started by this endpoint.
+    """
+    upload, error = _read_image_upload()
+    if error is not None:
+        return error
+    image_bytes, options, recipe_types_list = upload
+    extraction_cache = get_extraction_cache()
+
+    result = extraction.cached_recipe(extraction_cache, image_bytes, options,
+                                      recipe_types_list)
+    if result is not None:
+        job = jobs.done(result)
+        events = [_sse('accepted', {'job': {'id': job.id,
+                                            'status': job.status}}),
+                  _sse('result', result)]
+        return Response(events, mimetype='text/event-stream',
+                        headers=SSE_HEADERS)
+
+    client = extraction.get_llm_client()
+    retry_after = client.retry_after()
+    if retry_after:
+        return _upstream_unavailable(retry_after)
+
+    def run(job):
+        return extraction.extract_recipe(
+            client, image_bytes, options, recipe_types_list, job.should_stop,
+            cache=extraction_cache, emit=job.publish
+        )
+
+    try:
+        job = jobs.submit(run, key=extraction.upload_key(
+            image_bytes, options, recipe_types_list))
+    except JobQueueFull:
+        return _queue_full()
+
+    def generate():
+        try:
+            yield _sse('accepted', {'job': job.to_dict()})
+            sent = 0
+            while True:
+                events = job.wait_events(sent, SSE_KEEPALIVE_SECONDS)
+                if not events:
+                    if not job.pending:
+                        break
+                    yield ': keepalive\n\n'
+                    continue
+                sent += len(events)
+                for event in events:
+                    yield _sse(*event)
+            finished = job.to_dict()
+            if finished['status'] == 'done':
+                yield _sse('result', finished['result'])
+            else:
+                yield _sse('error', {
+                    'status': finished['status'],
+                    'error': finished.get('error') or finished['status'],
+                })
+        finally:
+            # The client went away (or the stream ended): stop paying for
+            # model calls nobody will see.
+            job.detach()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers=SSE_HEADERS)
+
+
+@recipe_bp.route('/process-image/<job_id>', methods=['GET'])
+def image_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job": job.to_dict()})
+
+
+@recipe_bp.route('/process-image/<job_id>', methods=['DELETE'])
+def cancel_image_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job.cancel()
+    return jsonify({"job": job.to_dict()})
+
+
+@recipe_bp.route('/', methods=['GET'])
+@read_only
+@cache.cached('recipe', 'ingredient', 'recipe_type')
+def list_recipes():
+    """
+    List recipes one page at a time.
+
+    Pages are keyed on ``Recipe.id``: pass the ``next`` value of the previous
+    response as ``after`` to fetch the following page. With ``stream=json``
+    or ``stream=ndjson`` every recipe after ``after`` is streamed instead.
+
+    ``fields`` picks the columns (``name``, ``steps``) and ``include`` the
+    relationships (``types``, ``ingredients``) to return, all of them by
+    default; ``fields=name&include=`` returns just ids and names. What is
+    left out is not read from the database either.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "'limit' and 'after' must be integers"}), 400
+    try:
+        columns, relationships = _parse_fieldset()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stream_format = request.args.get('stream')
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return jsonify({"error": "'stream' must be 'json' or 'ndjson'"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify(
+            {"error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}
+        ), 400
+
+    # One query for the page plus one per included relationship, however
+    # many rows the page holds.
+    query = (
+        Recipe.query
+        .options(*serializers.recipe_options(columns, relationships))
+        .filter(Recipe.id > after)
+        .order_by(Recipe.id)
+    )
+    if _is_full(columns, relationships):
+        serialize = None
+    else:
+        serialize = partial(serializers.sparse_recipe, columns=columns,
+                            relationships=relationships)
+
+    if stream_format is not None:
+        # yield_per reads through a server-side cursor and runs the
+        # relationship loads once per batch of rows.
+        recipes = query.yield_per(STREAM_BATCH_SIZE)
+        return streamed_response(
+            'recipes', map(serialize, recipes) if serialize else recipes,
+            stream_format
+        )
+
+    recipes = query.limit(limit + 1).all()
+    has_more = len(recipes) > limit
+    recipes = recipes[:limit]
+
+    return jsonify({
+        "recipes": list(map(serialize, recipes)) if serialize else recipes,
+        "next": recipes[-1].id if has_more else None,
+    })
+
+
+@recipe_bp.route('/cook', methods=['GET'])
+@read_only
+def cook_with():
+    """
+    Find the recipes that can be cooked, or almost cooked, from a pantry.
+
+    ``ingredients`` and ``types`` are comma separated ids; ``max_missing``
+    drops recipes that need more than that many extra ingredients.
+    """
+    try:
+        pantry = _parse_ids('ingredients')
+        type_ids = _parse_ids('types')
+        max_missing = request.args.get('max_missing', type=int)
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Ids and limits must be integers"}), 400
+
+    if not pantry:
+        return jsonify({"error": "At least one ingredient is required"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify(
+            {"error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}
+        ), 400
+
+    matches = get_pantry_index().match(
+        pantry, type_ids=type_ids, max_missing=max_missing, limit=limit
+    )
+    names = dict(
+        db.session.query(Recipe.id, Recipe.name)
+        .filter(Recipe.id.in_([rid for rid, _, _ in matches]))
+    )
+
+    recipe_list = [{
+        'id': rid,
+        'name': names[rid],
+        'coverage': round(coverage, 4),
+        'missing': missing,
+    } for rid, coverage, missing in matches if rid in names]
+
+    return jsonify({"recipes": recipe_list})
+
+
+@recipe_bp.route('/shopping-list', methods=['POST'])
+@read_only
+def shopping_list():
+    """
+    Build one shopping list for several recipes.
+
+    Expects ``{"recipes": [{"id": 1, "multiplier": 2}, ...]}``; the
+    multiplier scales a recipe's amounts and defaults to 1. A recipe listed
+    twice counts with the sum of its multipliers.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('recipes')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "'recipes' must be a non-empty list"}), 400
+    if len(entries) > MAX_SHOPPING_LIST_RECIPES:
+        return jsonify({
+            "error": f"At most {MAX_SHOPPING_LIST_RECIPES} recipes per list"
+        }), 400
+
+    multipliers = {}
+    for entry in entries:
+        try:
+            recipe_id = int(entry['id'])
+            multiplier = float(entry.get('multiplier', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({
+                "error": "Each recipe needs an integer 'id' and a numeric "
+                         "'multiplier'"
+            }), 400
+        # float() also reads "nan" and "inf", which cannot be summed.
+        if not math.isfinite(multiplier) or multiplier <= 0:
+            return jsonify(
+                {"error": "'multiplier' must be a positive finite number"}
+            ), 400
+        multipliers[recipe_id] = multipliers.get(recipe_id, 0) + multiplier
+
+    return jsonify({"categories": shopping.shopping_list(multipliers)})
+
+
+@recipe_bp.route('/search', methods=['GET'])
+@read_only
+def search_recipes():
+    """Rank recipes whose name, steps or ingredients match ``q``."""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+
+    if not query:
+        return jsonify({"error": "Search query 'q' is required"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify(
+            {"error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}
+        ), 400
+
+    recipe_list = [{
+        'id': recipe_id,
+        'name': name,
+    } for recipe_id, name in recipe_search.search_recipes(query, limit)]
+
+    return jsonify({"recipes": recipe_list})
+
+
+@recipe_bp.route('/export', methods=['GET'])
+@read_only
+def export_recipes():
+    """
+    Stream the whole catalogue as NDJSON (``format=ndjson``, the default)
+    or CSV (``format=csv``) for backups and analytics.
+
+    Pass the last recipe id received as ``after`` to resume an interrupted
+    export. The output is gzipped on the fly when the client accepts it.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in export.EXPORT_FORMATS:
+        return jsonify({"error": "'format' must be 'ndjson' or 'csv'"}), 400
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "'after' must be an integer"}), 400
+    return export.export_response(export_format, after)
+
+
+@recipe_bp.route('/<int:recipe_id>', methods=["GET"])
+@read_only
+@cache.cached('recipe', 'ingredient', 'recipe_type')
+def get_recipe(recipe_id: int):
+    """
+    Return one recipe; ``fields`` and ``include`` as for the list.
+
+    The whole recipe in JSON is its stored document, sent as it is read;
+    other shapes and recipes without a document are built from the tables.
+    """
+    try:
+        columns, relationships = _parse_fieldset()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if _is_full(columns, relationships) and negotiate() == JSON:
+        body = documents.get_document(recipe_id)
+        if body is not None:
+            response = current_app.response_class(
+                b'{"recipe":' + body + b'}', mimetype=JSON
+            )
+            response.vary.add('Accept')
+            return response
+
+    recipe = (
+        Recipe.query
+        .options(*serializers.recipe_options(columns, relationships,
+                                             detail=True))
+        .filter(Recipe.id == recipe_id)
+        .first_or_404()
+    )
+    return jsonify({"recipe": serializers.sparse_recipe(
+        recipe, columns, relationships, detail=True
+    )})
+
+
+@recipe_bp.route('/<int:recipe_id>/similar', methods=["GET"])
+@read_only
+@cache.cached('recipe', 'recipe_type')
+def similar_recipes(recipe_id: int):
+    """
+    Find the recipes whose ingredients are most like those of a recipe.
+
+    ``same_type=1`` keeps only recipes sharing one of its types. The
+    similarity is an estimate of the Jaccard index of the ingredient sets.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SIMILAR))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify(
+            {"error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}
+        ), 400
+    same_type = request.args.get('same_type') in ('1', 'true')
+
+    if db.session.get(Recipe, recipe_id) is None:
+        return jsonify({"error": "Recipe not found"}), 404
+
+    matches = get_similar_index().similar(recipe_id, limit=limit,
+                                          same_type=same_type)
+    names = dict(
+        db.session.query(Recipe.id, Recipe.name)
+        .filter(Recipe.id.in_([rid for rid, _ in matches]))
+    )
+
+    recipe_list = [{
+        'id': rid,
+        'name': names[rid],
+        'similarity': round(score, 4),
+    } for rid, score in matches if rid in names]
+
+    return jsonify({"recipes": recipe_list})
+
+
+def _reference_id(value, kind):
+    """Read a type or ingredient id sent as a number or a numeric string."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdecimal():
+        return int(value)
+    raise ValueError(f"Invalid {kind} id {value!r}")
+
+
+def _resolve_references(data):
+    """
+    Look up every type and ingredient a recipe payload refers to.
+
+    Returns ``(type_ids, ingredient_rows, unknown)`` where ``ingredient_rows``
+    are the ``recipe_ingredient`` values to insert, without ``recipe_id``,
+    and ``unknown`` maps "types"/"ingredients" to the ids that do not exist.
+    Each kind of reference costs a single ``IN`` query. Ids that are not
+    integers raise ``ValueError``.
+    """
+    type_ids = list(dict.fromkeys(
+        _reference_id(type_id, 'type') for type_id in data.get("types") or []
+    ))
+    ingredient_rows = []
+    for ingredient_data in data.get("ingredients") or []:
+        ingredient_name = ingredient_data.get('name')
+        amount = ingredient_data.get('amount')
+        unit = ingredient_data.get('unit')
+
+        if not ingredient_name or not amount or not unit:
+            continue  # Skip invalid entries
+
+        ingredient_rows.append({
+            'ingredient_id': _reference_id(ingredient_data.get("id"),
+                                           'ingredient'),
+            'amount': units.parse_amount(amount),
+            'unit': unit,
+        })
+
+    ingredient_ids = {row['ingredient_id'] for row in ingredient_rows}
+    known_types = set()
+    if type_ids:
+        known_types = set(db.session.scalars(
+            db.select(RecipeType.id).where(RecipeType.id.in_(type_ids))
+        ))
+    known_ingredients = set()
+    if ingredient_ids:
+        known_ingredients = set(db.session.scalars(
+            db.select(Ingredient.id).where(Ingredient.id.in_(ingredient_ids))
+        ))
+
+    unknown = {
+        'types': [i for i in type_ids if i not in known_types],
+        'ingredients': [
+            i for i in dict.fromkeys(r['ingredient_id']
+                                     for r in ingredient_rows)
+            if i not in known_ingredients
+        ],
+    }
+    return type_ids, ingredient_rows, unknown
+
+
+def _unknown_references_error(unknown):
+    return jsonify({
+        "error": "Unknown ingredient or type ids",
+        "unknown_types": unknown['types'],
+        "unknown_ingredients": unknown['ingredients'],
+    }), 400
+
+
+def _insert_references(recipe_id, type_ids, ingredient_rows):
+    """Bulk insert the type and ingredient rows of a recipe."""
+    if type_ids:
+        db.session.execute(recipe_type_association.insert(), [
+            {'recipe_id': recipe_id, 'type_id': type_id}
+            for type_id in type_ids
+        ])
+    if ingredient_rows:
+        db.session.execute(db.insert(RecipeIngredient), [
+            dict(row, recipe_id=recipe_id) for row in ingredient_rows
+        ])
+
+
+@recipe_bp.route('/add', methods=['GET', 'POST'])
+def add_recipe():
+    try:
+        data = request.get_json()
+
+        if not data.get("name") or not data.get("steps") or not data.get(
+                "ingredients"):
+            return jsonify(
+                {"error": "Recipe name, steps, and ingredients are required"}
+            ), 400
+
+        type_ids, ingredient_rows, unknown = _resolve_references(data)
+        if unknown['types'] or unknown['ingredients']:
+            return _unknown_references_error(unknown)
+
+        new_recipe = Recipe(
+            name=data.get("name"),
+            source="",  # Default value for source
+            steps=data.get("steps")
+        )
+        db.session.add(new_recipe)
+        db.session.flush()
+        _insert_references(new_recipe.id, type_ids, ingredient_rows)
+
+        recipe_search.index_recipe(new_recipe.id)
+        similar.index_recipe(new_recipe.id)
+        documents.index_recipe(new_recipe.id)
+        db.session.commit()
+        cache.bump('recipe')
+        get_pantry_index().refresh(new_recipe.id)
+        get_similar_index().refresh(new_recipe.id)
+        return jsonify({"message": "Recipe added successfully",
+                        "recipe_id": new_recipe.id}), 201
+    except ValueError as e:
+        # An ingredient amount or a reference id that cannot be read as a
+        # number
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.info(e)
+        return jsonify({"error": str(e)}), 500
+
+
+def _diff_ingredients(stored_rows, ingredient_rows):
+    """
+    Compare the stored ``recipe_ingredient`` rows of a recipe with the
+    wanted ones; returns ``(inserts, updates, delete_ids)``.
+
+    A wanted row takes over a stored row of the same ingredient, which is
+    only updated if its quantity differs, so unchanged ingredients are not
+    written at all.
+    """
+    stored = {}
+    for row in stored_rows:
+        stored.setdefault(row.ingredient_id, []).append(row)
+    inserts, updates = [], []
+    for row in ingredient_rows:
+        matches = stored.get(row['ingredient_id'])
+        if not matches:
+            inserts.append(row)
+            continue
+        old = matches.pop(0)
+        if (old.amount, old.unit) != (row['amount'], row['unit']):
+            # Column defaults only apply to inserts.
+            base_amount, base_unit = units.to_base(row['amount'], row['unit'])
+            updates.append({'id': old.id, 'amount': row['amount'],
+                            'unit': row['unit'], 'base_amount': base_amount,
+                            'base_unit': base_unit})
+    delete_ids = [row.id for rows in stored.values() for row in rows]
+    return inserts, updates, delete_ids
+
+
+def _version_conflict(recipe_id):
+    version = db.session.scalar(
+        db.select(Recipe.version).where(Recipe.id == recipe_id)
+    )
+    return jsonify({
+        "error": "The recipe was changed by someone else, reload it",
+        "version": version,
+    }), 409
+
+
+@recipe_bp.route('/edit/<int:recipe_id>', methods=['PUT', 'PATCH'])
+def edit_recipe(recipe_id):
+    """
+    Update a recipe, writing only what changed.
+
+    ``PUT`` replaces the recipe: ``name``, ``steps``, ``ingredients`` and
+    ``types`` are required, types left out of the list are removed. ``PATCH``
+    only changes the fields present in the body. Types and ingredients are
+    compared with the stored rows, and only the rows that differ are
+    inserted, updated or deleted; the search, similarity and pantry indexes
+    are only rewritten when what they are built from changed.
+
+    Pass the ``version`` the recipe was read with: if it was edited since,
+    the edit is refused with 409 and the current version. Every edit that
+    changes something bumps the version and returns the new one.
+    """
+    try:
+        data = request.get_json()
+        partial = request.method == 'PATCH'
+        expected = data.get("version")
+        if expected is not None and (not isinstance(expected, int) or
+                                     isinstance(expected, bool)):
+            return jsonify({"error": "'version' must be an integer"}), 400
+        if partial:
+            if any(field in data and not data[field]
+                   for field in ("name", "steps", "ingredients")):
+                return jsonify(
+                    {"error": "Recipe name, steps, and ingredients cannot "
+                              "be empty"}
+                ), 400
+        elif not data.get("name") or not data.get("steps") or not data.get(
+                "ingredients"):
+            return jsonify(
+                {"error": "Recipe name, steps, and ingredients are required"}
+            ), 400
+        elif "types" not in data:
+            # Not taken as "no types": older clients left it out to keep them.
+            return jsonify(
+                {"error": "'types' is required, send [] to remove every type"}
+            ), 400
+
+        stored = db.session.execute(
+            db.select(Recipe.name, Recipe.source, Recipe.steps,
+                      Recipe.version)
+            .where(Recipe.id == recipe_id)
+        ).first()
+        if stored is None:
+            return jsonify({"error": "Recipe not found"}), 404
+        if expected is not None and expected != stored.version:
+            return _version_conflict(recipe_id)
+
+        type_ids, ingredient_rows, unknown = _resolve_references(data)
+        if unknown['types'] or unknown['ingredients']:
+            return _unknown_references_error(unknown)
+
+        columns = {field: data[field] for field in EDITABLE_COLUMNS
+                   if field in data and data[field] != getattr(stored, field)}
+
+        added_types, removed_types = [], []
+        if not partial or "types" in data:
+            stored_types = set(db.session.scalars(
+                db.select(recipe_type_association.c.type_id)
+                .where(recipe_type_association.c.recipe_id == recipe_id)
+            ))
+            added_types = [i for i in type_ids if i not in stored_types]
+            removed_types = list(stored_types.difference(type_ids))
+
+        inserts, updates, delete_ids = [], [], []
+        ingredients_changed = False
+        if "ingredients" in data:
+            stored_rows = db.session.execute(
+                db.select(RecipeIngredient.id, RecipeIngredient.ingredient_id,
+                          RecipeIngredient.amount, RecipeIngredient.unit)
+                .where(RecipeIngredient.recipe_id == recipe_id)
+                .order_by(RecipeIngredient.id)
+            ).all()
+            inserts, updates, delete_ids = _diff_ingredients(stored_rows,
+                                                             ingredient_rows)
+            ingredients_changed = \
+                {row.ingredient_id for row in stored_rows} != \
+                {row['ingredient_id'] for row in ingredient_rows}
+        types_changed = bool(added_types or removed_types)
+
+        if not (columns or types_changed or inserts or updates or
+                delete_ids):
+            return jsonify({"message": "Recipe unchanged",
+                            "recipe": recipe_id,
+                            "version": stored.version}), 200
+
+        # Conditional on the version read above: a concurrent edit that
+        # committed in between bumped it and this matches no row.
+        bumped = db.session.execute(
+            db.update(Recipe)
+            .where(Recipe.id == recipe_id, Recipe.version == stored.version)
+            .values(version=Recipe.version + 1, **columns)
+        )
+        if bumped.rowcount != 1:
+            db.session.rollback()
+            return _version_conflict(recipe_id)
+
+        if removed_types:
+            db.session.execute(recipe_type_association.delete().where(
+                recipe_type_association.c.recipe_id == recipe_id,
+                recipe_type_association.c.type_id.in_(removed_types)
+            ))
+        if delete_ids:
+            db.session.execute(db.delete(RecipeIngredient).where(
+                RecipeIngredient.id.in_(delete_ids)
+            ))
+        if updates:
+            db.session.execute(db.update(RecipeIngredient), updates)
+        _insert_references(recipe_id, added_types, inserts)
+
+        if ingredients_changed or columns.keys() & {"name", "steps"}:
+            recipe_search.index_recipe(recipe_id)
+        if ingredients_changed:
+            similar.index_recipe(recipe_id)
+        documents.index_recipe(recipe_id)
+        db.session.commit()
+        cache.bump('recipe')
+        if ingredients_changed or types_changed:
+            get_pantry_index().refresh(recipe_id)
+            get_similar_index().refresh(recipe_id)
+        return jsonify({"message": "Recipe updated successfully",
+                        "recipe": recipe_id,
+                        "version": stored.version + 1}), 200
+    except ValueError as e:
+        # An ingredient amount or a reference id that cannot be read as a
+        # number
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.info(e)
+        return jsonify({"error": str(e)}), 500
+
+
+@recipe_bp.route('/import', methods=['POST'])
+def import_recipes():
+    """
+    Import recipes from an NDJSON or JSON array body.
+
+    The response is NDJSON too: one result per record as its batch commits,
+    followed by a summary line.
+    """
+    batch_size = request.args.get(
+        'batch_size', current_app.config['IMPORT_BATCH_SIZE'], type=int
+    )
+    if not 1 <= batch_size <= MAX_IMPORT_BATCH_SIZE:
+        return jsonify({
+            "error": f"'batch_size' must be between 1 and "
+                     f"{MAX_IMPORT_BATCH_SIZE}"
+        }), 400
+
+    summary = {'imported': 0, 'failed': 0, 'ingredients_created': 0}
+
+    def on_commit(created_ingredients):
+        cache.bump('recipe', 'ingredient')
+        get_pantry_index().invalidate()
+        get_similar_index().invalidate()
+        suggest_index = get_suggest_index()
+        for ingredient_id, name in created_ingredients:
+            suggest_index.add(ingredient_id, name)
+
+    def generate():
+        results = importer.import_recipes(
+            request.stream, batch_size, summary, on_commit
+        )
+        for result in results:
+            yield json.dumps(result) + '\n'
+        yield json.dumps({"summary": summary}) + '\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
+
+
+@recipe_bp.route('/delete/<int:recipe_id>', methods=['DELETE'])
+def delete_recipe(recipe_id):
+    try:
+        recipe = Recipe.query.get_or_404(recipe_id)
+
+        RecipeIngredient.query.filter_by(recipe_id=recipe_id).delete()
+
+        recipe_search.remove_recipe(recipe_id)
+        similar.remove_recipe(recipe_id)
+        documents.remove_recipe(recipe_id)
+        db.session.delete(recipe)
+        db.session.commit()
+        cache.bump('recipe')
+        get_pantry_index().remove(recipe_id)
+        get_similar_index().remove(recipe_id)
+
+        return jsonify({"message": "Recipe deleted successfully"}), 200
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error deleting recipe: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@recipe_bp.cli.command('rebuild-documents')
+@click.option('--batch-size', default=documents.REBUILD_BATCH_SIZE,
+              show_default=True, help="recipes per transaction")
+@click.option('--workers', default=4, show_default=True,
+              help="batches rebuilt in parallel")
+def rebuild_documents(batch_size, workers):
+    """Rebuild the stored JSON document of every recipe."""
+    started = time.perf_counter()
+    count = documents.rebuild(batch_size, workers)
+    click.echo(f"Rebuilt {count} recipe documents in "
+               f"{time.perf_counter() - started:.1f}s")
@@ -0,0 +1,143 @@
+"""
+Full-text search over recipe names, steps and ingredient names.
+
+PostgreSQL keeps a weighted ``tsvector`` in ``recipe.search_vector`` behind a
+GIN index, SQLite keeps the same text in the ``recipe_fts`` FTS5 table. Both
+are created by the ``b7d4e9a1c3f2`` migration, or by ``db.create_all()``
+through the DDL hooks below, and are kept up to date by ``index_recipe``
+inside the transaction that changes the recipe.
+"""
+import re
+
+from sqlalchemy import DDL, bindparam, event, text
+
+from app import db
+from app.models import Recipe
+
+
+def _documents(aggregate):
+    """
+    Select the searchable text of the recipes in ``:ids``.
+
+    Ingredient names are joined and grouped rather than read through a
+    correlated subquery so that indexing a whole batch stays one pass over
+    ``recipe_ingredient``.
+    """
+    return f"""
+        SELECT recipe.id AS id, recipe.name AS name, recipe.steps AS steps,
+               coalesce({aggregate}(i.name, ' '), '') AS ingredients
+        FROM recipe
+        LEFT JOIN recipe_ingredient ri ON ri.recipe_id = recipe.id
+        LEFT JOIN ingredient i ON i.id = ri.ingredient_id
+        WHERE recipe.id IN :ids
+        GROUP BY recipe.id
+    """
+
+
+POSTGRES_UPDATE = f"""
+    UPDATE recipe SET search_vector =
+        setweight(to_tsvector('english', coalesce(doc.name, '')), 'A') ||
+        setweight(to_tsvector('english', doc.ingredients), 'B') ||
+        setweight(to_tsvector('english', coalesce(doc.steps, '')), 'C')
+    FROM ({_documents('string_agg')}) AS doc
+    WHERE recipe.id = doc.id
+"""
+
+SQLITE_INSERT = f"""
+    INSERT INTO recipe_fts (rowid, name, ingredients, steps)
+    SELECT id, name, ingredients, steps FROM ({_documents('group_concat')})
+"""
+
+POSTGRES_DDL = [
+    "ALTER TABLE recipe ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_search_vector "
+    "ON recipe USING gin (search_vector)",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING "
+    "fts5(name, ingredients, steps, tokenize='porter unicode61')",
+]
+
+for statement in POSTGRES_DDL:
+    event.listen(Recipe.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Recipe.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Recipe.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS recipe_fts')
+             .execute_if(dialect='sqlite'))
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def index_recipe(recipe_id):
+    """Rewrite the search entry of one recipe in the current transaction."""
+    index_recipes([recipe_id])
+
+
+def index_recipes(recipe_ids):
+    """Rewrite the search entries of several recipes in two statements."""
+    db.session.flush()
+    params = {"ids": list(recipe_ids)}
+    ids = bindparam('ids', expanding=True)
+    if _dialect() == 'postgresql':
+        db.session.execute(text(POSTGRES_UPDATE).bindparams(ids), params)
+    elif _dialect() == 'sqlite':
+        db.session.execute(
+            text("DELETE FROM recipe_fts WHERE rowid IN :ids")
+            .bindparams(ids),
+            params
+        )
+        db.session.execute(text(SQLITE_INSERT).bindparams(ids), params)
+
+
+def remove_recipe(recipe_id):
+    """Drop the search entry of a recipe that is being deleted."""
+    if _dialect() == 'sqlite':
+        db.session.execute(
+            text("DELETE FROM recipe_fts WHERE rowid = :id"),
+            {"id": recipe_id}
+        )
+
+
+def _fts5_query(query):
+    # Quote every word so that user input can never be parsed as FTS5
+    # syntax, and let the last one match as a prefix.
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_recipes(query, limit):
+    """Return ``(recipe_id, name)`` pairs for ``query``, best match first."""
+    if _dialect() == 'postgresql':
+        rows = db.session.execute(
+            text("SELECT id, name FROM recipe, "
+                 "websearch_to_tsquery('english', :q) AS query "
+                 "WHERE search_vector @@ query "
+                 "ORDER BY ts_rank(search_vector, query) DESC, id "
+                 "LIMIT :limit"),
+            {"q": query, "limit": limit}
+        )
+    else:
+        match = _fts5_query(query)
+        if match is None:
+            return []
+        # bm25() is lower for better matches; weigh name over ingredients
+        # over steps like the PostgreSQL vector does.
+        rows = db.session.execute(
+            text("SELECT recipe.id, recipe.name FROM recipe_fts "
+                 "JOIN recipe ON recipe.id = recipe_fts.rowid "
+                 "WHERE recipe_fts MATCH :q "
+                 "ORDER BY bm25(recipe_fts, 10.0, 4.0, 1.0), recipe.id "
+                 "LIMIT :limit"),
+            {"q": match, "limit": limit}
+        )
+    return [tuple(row) for row in rows]
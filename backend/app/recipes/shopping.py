@@ -0,0 +1,79 @@
+"""
+Consolidated shopping list for a set of recipes.
+
+The whole aggregation is one statement: the canonical ``base_amount`` of
+every ``recipe_ingredient`` row of the requested recipes is scaled by its
+recipe's multiplier in SQL, then summed per ingredient and base unit by a
+``GROUP BY``. Only the aggregated lines come back to Python, so
+the cost on this side does not grow with the number of recipes.
+"""
+from sqlalchemy import case, func
+
+from app import db
+from app.models import Ingredient, IngredientCategory, RecipeIngredient
+from app.recipes.units import readable, sql_factor
+
+UNCATEGORIZED = "Other"
+
+
+def _aggregate(multipliers):
+    multiplier = case(multipliers, value=RecipeIngredient.recipe_id)
+
+    # Row-wise scaling in a subquery, so that the outer GROUP BY only
+    # refers to plain columns. The factor is only needed to pick the unit
+    # the total is shown in.
+    rows = (
+        db.select(
+            RecipeIngredient.ingredient_id,
+            RecipeIngredient.base_unit.label('base'),
+            sql_factor(RecipeIngredient.unit).label('factor'),
+            (RecipeIngredient.base_amount * multiplier).label('amount'),
+        )
+        .where(RecipeIngredient.recipe_id.in_(multipliers))
+        .subquery()
+    )
+    return (
+        db.select(
+            IngredientCategory.id,
+            IngredientCategory.name,
+            Ingredient.id,
+            Ingredient.name,
+            rows.c.base,
+            func.sum(rows.c.amount),
+            func.min(rows.c.factor),
+            func.max(rows.c.factor),
+        )
+        .join(Ingredient, Ingredient.id == rows.c.ingredient_id)
+        .outerjoin(IngredientCategory,
+                   IngredientCategory.id == Ingredient.category_id)
+        .group_by(IngredientCategory.id, IngredientCategory.name,
+                  Ingredient.id, Ingredient.name, rows.c.base)
+        .order_by(IngredientCategory.name, Ingredient.name, rows.c.base)
+    )
+
+
+def shopping_list(multipliers):
+    """
+    Sum the ingredients of the recipes in ``multipliers``.
+
+    ``multipliers`` maps recipe ids to the number of servings to scale them
+    by. Returns the categories in name order, each with its ingredient
+    lines; an ingredient used with units of different dimensions gets one
+    line per dimension.
+    """
+    categories = {}
+    for category_id, category_name, ingredient_id, name, base, total, \
+            smallest, largest in db.session.execute(_aggregate(multipliers)):
+        amount, unit = readable(total, base, smallest, largest)
+        category = categories.setdefault(category_id, {
+            'id': category_id,
+            'name': category_name or UNCATEGORIZED,
+            'ingredients': [],
+        })
+        category['ingredients'].append({
+            'id': ingredient_id,
+            'name': name,
+            'amount': round(amount, 2),
+            'unit': unit,
+        })
+    return list(categories.values())
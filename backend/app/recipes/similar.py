@@ -0,0 +1,343 @@
+"""
+"Similar recipes" lookups over ingredient sets with MinHash and LSH.
+
+Every recipe gets a MinHash signature of its ingredient ids: ``NUM_PERM``
+minimums of independent hash functions, any position of which agrees
+between two recipes with a probability equal to the Jaccard similarity of
+their ingredient sets. Signatures are cut into ``BANDS`` bands of ``ROWS``
+values and each band is hashed into a bucket, so recipes that share a
+bucket in any band become candidates; with 32 bands of 3 rows pairs above a
+similarity of about 0.3 are very likely to be found, pairs far below it
+rarely are. Candidates are ranked by the number of bands they share and the
+best ones by their estimated similarity, so a query never looks at the
+recipes that have nothing in common with the one asked about.
+
+Signatures are stored in ``recipe_signature`` next to the recipe, written
+in the same transaction as the recipe itself, so building the index after a
+restart only reads them back. Recipes that have no stored signature yet are
+hashed and stored on the first build.
+
+Like the pantry index, the index is updated in place for the writes of this
+worker and rebuilt when the ``recipe`` version shows a write of another.
+"""
+import heapq
+import random
+import threading
+from array import array
+from collections import Counter
+from functools import lru_cache
+from itertools import chain, compress
+from operator import eq, itemgetter, ne
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.cache import TableWatch
+from app.models import RecipeIngredient, RecipeSignature, \
+    recipe_type_association
+
+BANDS = 32
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+# largest prime below 2**32, so every hash value fits an unsigned int
+PRIME = 4294967291
+SEED = 1
+# candidates ranked by band hits whose similarity is then estimated
+CANDIDATES_PER_RESULT = 4
+# ingredients whose hash values are kept between signatures
+HASH_CACHE_SIZE = 4096
+
+_random = random.Random(SEED)
+_COEFFICIENTS = [
+    (_random.randrange(1, PRIME), _random.randrange(0, PRIME))
+    for _ in range(NUM_PERM)
+]
+_BAND_BYTES = ROWS * array('I').itemsize
+SIGNATURE_BYTES = NUM_PERM * array('I').itemsize
+
+
+@lru_cache(maxsize=HASH_CACHE_SIZE)
+def _hashes(ingredient_id):
+    # A tuple of 96 ints takes about 4 KB: only the most used ingredients
+    # are kept, not every one ever seen.
+    return tuple((a * ingredient_id + b) % PRIME for a, b in _COEFFICIENTS)
+
+
+def signature(ingredient_ids):
+    """Return the MinHash signature of a set of ingredient ids as bytes."""
+    return array(
+        'I', map(min, zip(*map(_hashes, ingredient_ids)))
+    ).tobytes()
+
+
+def _bands(sig):
+    return [sig[i:i + _BAND_BYTES] for i in range(0, len(sig), _BAND_BYTES)]
+
+
+def _similarity(sig, other):
+    return sum(map(eq, array('I', sig), array('I', other))) / NUM_PERM
+
+
+def _ingredient_sets(recipe_ids=None, unsigned=False):
+    """
+    Read the ingredient ids of ``recipe_ids``, or of every recipe, or with
+    ``unsigned`` of the recipes without an up to date stored signature.
+    """
+    query = db.select(RecipeIngredient.recipe_id,
+                      RecipeIngredient.ingredient_id)
+    if recipe_ids is not None:
+        query = query.where(RecipeIngredient.recipe_id.in_(recipe_ids))
+    if unsigned:
+        query = query.where(~db.exists().where(
+            RecipeSignature.recipe_id == RecipeIngredient.recipe_id,
+            func.length(RecipeSignature.signature) == SIGNATURE_BYTES,
+        ))
+    ingredients = {}
+    for recipe_id, ingredient_id in db.session.execute(query):
+        ingredients.setdefault(recipe_id, set()).add(ingredient_id)
+    return ingredients
+
+
+def _type_sets(recipe_ids=None):
+    query = db.select(recipe_type_association.c.recipe_id,
+                      recipe_type_association.c.type_id)
+    if recipe_ids is not None:
+        query = query.where(
+            recipe_type_association.c.recipe_id.in_(recipe_ids)
+        )
+    types = {}
+    for recipe_id, type_id in db.session.execute(query):
+        types.setdefault(recipe_id, set()).add(type_id)
+    return {rid: frozenset(ids) for rid, ids in types.items()}
+
+
+def _insert_missing(connection):
+    """
+    An insert of signatures that skips the recipes whose signature was
+    stored meanwhile by the transaction of a write.
+    """
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(
+        connection.dialect.name
+    )
+    if dialect is None:
+        return db.insert(RecipeSignature)
+    return dialect.insert(RecipeSignature).on_conflict_do_nothing(
+        index_elements=[RecipeSignature.recipe_id]
+    )
+
+
+def index_recipes(recipe_ids):
+    """
+    Store the signatures of recipes that were added or edited.
+
+    Runs inside the caller's transaction, before it commits.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    remove_recipes(recipe_ids)
+    rows = [{'recipe_id': recipe_id, 'signature': signature(ids)}
+            for recipe_id, ids in _ingredient_sets(recipe_ids).items()]
+    if rows:
+        db.session.execute(db.insert(RecipeSignature), rows)
+
+
+def index_recipe(recipe_id):
+    index_recipes([recipe_id])
+
+
+def remove_recipes(recipe_ids):
+    db.session.execute(db.delete(RecipeSignature).where(
+        RecipeSignature.recipe_id.in_(recipe_ids)
+    ))
+
+
+def remove_recipe(recipe_id):
+    remove_recipes([recipe_id])
+
+
+class SimilarIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._watch = TableWatch('recipe')
+        # recipe id -> signature bytes / type ids
+        self._signatures = {}
+        self._types = {}
+        # one dict per band: band bytes -> id or list of ids of the recipes
+        # in that bucket
+        self._buckets = [{} for _ in range(BANDS)]
+
+    def _add(self, recipe_id, sig):
+        # Most buckets hold a single recipe: keep those as a bare id rather
+        # than a container, which is most of the memory of the index.
+        self._signatures[recipe_id] = sig
+        for buckets, band in zip(self._buckets, _bands(sig)):
+            bucket = buckets.get(band)
+            if bucket is None:
+                buckets[band] = recipe_id
+            elif type(bucket) is int:
+                buckets[band] = [bucket, recipe_id]
+            else:
+                bucket.append(recipe_id)
+
+    def _fill_buckets(self):
+        """Bucket every signature at once, band by band."""
+        rids = list(self._signatures)
+        signatures = list(self._signatures.values())
+        for offset, buckets in zip(range(0, SIGNATURE_BYTES, _BAND_BYTES),
+                                   self._buckets):
+            bands = list(map(
+                itemgetter(slice(offset, offset + _BAND_BYTES)), signatures
+            ))
+            buckets.update(zip(bands, rids))
+            if len(buckets) == len(bands):
+                continue
+            # A band shared by several recipes kept only the last of them;
+            # those few bands get a list. The scans run in C (map/compress)
+            # since they touch every recipe.
+            shared = set(compress(
+                bands, map(ne, map(buckets.__getitem__, bands), rids)
+            ))
+            for band in shared:
+                buckets[band] = []
+            for band, rid in compress(zip(bands, rids),
+                                      map(shared.__contains__, bands)):
+                buckets[band].append(rid)
+
+    def _discard(self, recipe_id):
+        sig = self._signatures.pop(recipe_id, None)
+        self._types.pop(recipe_id, None)
+        if sig is None:
+            return
+        for buckets, band in zip(self._buckets, _bands(sig)):
+            bucket = buckets[band]
+            if type(bucket) is int:
+                del buckets[band]
+                continue
+            bucket.remove(recipe_id)
+            if len(bucket) == 1:
+                buckets[band] = bucket[0]
+
+    def _build(self):
+        stored = dict(db.session.execute(
+            db.select(RecipeSignature.recipe_id, RecipeSignature.signature)
+        ).tuples().all())
+        missing = {rid: signature(ids)
+                   for rid, ids in _ingredient_sets(unsigned=True).items()}
+        if missing:
+            # Signatures left from other hashing parameters are replaced.
+            outdated = [rid for rid in missing if rid in stored]
+            # Written on the primary in a transaction of its own: the build
+            # may run inside a read-only request.
+            with db.engine.begin() as connection:
+                if outdated:
+                    connection.execute(db.delete(RecipeSignature).where(
+                        RecipeSignature.recipe_id.in_(outdated)
+                    ))
+                inserted = set(connection.scalars(
+                    _insert_missing(connection)
+                    .returning(RecipeSignature.recipe_id),
+                    [{'recipe_id': rid, 'signature': sig}
+                     for rid, sig in missing.items()]
+                ))
+                # A write stored these first: its signature is the one to
+                # keep.
+                raced = [rid for rid in missing if rid not in inserted]
+                if raced:
+                    missing.update(connection.execute(
+                        db.select(RecipeSignature.recipe_id,
+                                  RecipeSignature.signature)
+                        .where(RecipeSignature.recipe_id.in_(raced))
+                    ).tuples().all())
+            stored.update(missing)
+
+        self._signatures = {rid: sig for rid, sig in stored.items()
+                            if len(sig) == SIGNATURE_BYTES}
+        self._fill_buckets()
+        self._types = _type_sets()
+        self._built = True
+
+    def _clear(self):
+        self._built = False
+        self._signatures, self._types = {}, {}
+        self._buckets = [{} for _ in range(BANDS)]
+
+    def _follow(self):
+        """Whether a write of this worker can be applied in place."""
+        if self._built and not self._watch.follow():
+            self._clear()
+        return self._built
+
+    def invalidate(self):
+        """Forget everything; the next query rebuilds the index."""
+        with self._lock:
+            self._clear()
+
+    def refresh(self, recipe_id):
+        """Re-read the stored signature of an added or edited recipe."""
+        with self._lock:
+            if not self._follow():
+                return
+            self._discard(recipe_id)
+            sig = db.session.scalar(
+                db.select(RecipeSignature.signature)
+                .where(RecipeSignature.recipe_id == recipe_id)
+            )
+            if sig is not None:
+                self._add(recipe_id, sig)
+                self._types.update(_type_sets([recipe_id]))
+
+    def remove(self, recipe_id):
+        """Drop a deleted recipe from the index."""
+        with self._lock:
+            if self._follow():
+                self._discard(recipe_id)
+
+    def similar(self, recipe_id, limit=10, same_type=False):
+        """
+        Return up to ``limit`` ``(recipe_id, similarity)`` pairs for the
+        recipes whose ingredients are most like those of ``recipe_id``,
+        optionally only among recipes sharing one of its types.
+        """
+        with self._lock:
+            if self._watch.changed() or not self._built:
+                self._clear()
+                self._build()
+            sig = self._signatures.get(recipe_id)
+            if sig is None:
+                return []
+
+            single, shared = [], []
+            for buckets, band in zip(self._buckets, _bands(sig)):
+                bucket = buckets[band]
+                if type(bucket) is int:
+                    single.append(bucket)
+                else:
+                    shared.append(bucket)
+            hits = Counter(single)
+            hits.update(chain.from_iterable(shared))
+            del hits[recipe_id]
+            if same_type:
+                wanted = self._types.get(recipe_id, frozenset())
+                types = self._types
+                hits = {rid: n for rid, n in hits.items()
+                        if not wanted.isdisjoint(types.get(rid, ()))}
+
+            candidates = heapq.nlargest(
+                limit * CANDIDATES_PER_RESULT, hits, key=hits.__getitem__
+            )
+            signatures = self._signatures
+            ranked = sorted(
+                ((_similarity(sig, signatures[rid]), rid)
+                 for rid in candidates),
+                key=lambda pair: (-pair[0], pair[1])
+            )
+            return [(rid, score) for score, rid in ranked[:limit]]
+
+
+def get_similar_index():
+    """Return the similar recipes index of the current application."""
+    return current_app.extensions.setdefault('similar_index', SimilarIndex())
@@ -0,0 +1,128 @@
+"""
+Measurement units and the parsing of free-text quantities.
+
+Every unit belongs to the dimension of its ``base`` unit (grams for mass,
+millilitres for volume) and converts to it by multiplying with ``factor``.
+Units that are not listed here, like "pinch" or "clove", are only
+normalized (trimmed, lower case) and only ever combined with the exact same
+unit; an empty unit stands for a count.
+
+``RecipeIngredient`` stores the converted quantity next to the original in
+``base_amount``/``base_unit``. ``to_base`` computes it in Python and is the
+insert default of those columns; ``sql_base``/``sql_factor`` compute the
+same in SQL for bulk updates and aggregations.
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import case, func, literal
+
+Unit = namedtuple('Unit', 'name base factor aliases')
+
+UNITS = (
+    Unit('mg', 'g', 0.001, ('milligram', 'milligrams')),
+    Unit('g', 'g', 1.0, ('gr', 'gram', 'grams', 'gramme', 'grammes')),
+    Unit('kg', 'g', 1000.0, ('kgs', 'kilogram', 'kilograms')),
+    Unit('ml', 'ml', 1.0, ('milliliter', 'milliliters', 'millilitre',
+                           'millilitres')),
+    Unit('l', 'ml', 1000.0, ('liter', 'liters', 'litre', 'litres')),
+    Unit('tsp', 'ml', 4.92892, ('tsps', 'teaspoon', 'teaspoons')),
+    Unit('tbsp', 'ml', 14.7868, ('tbs', 'tbsps', 'tablespoon',
+                                 'tablespoons')),
+    Unit('cup', 'ml', 236.588, ('cups',)),
+)
+
+# every spelling, lower case, to its unit
+ALIASES = {
+    alias: unit
+    for unit in UNITS
+    for alias in (unit.name, *unit.aliases)
+}
+
+
+VULGAR_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+# "2", "2.5", "2,5", "1/2", "1 1/2", optionally followed by a range end
+AMOUNT = re.compile(
+    r'^(?:(?P<whole>\d+)\s+)?(?P<number>\d+(?:[.,]\d+)?)'
+    r'(?:\s*/\s*(?P<denominator>\d+))?(?:\s*(?:-|–|to)\s*.*)?$'
+)
+
+
+def normalize_unit(unit):
+    return (unit or '').strip().lower()
+
+
+def lookup(unit):
+    """Return the ``Unit`` spelled ``unit``, or ``None`` if it is unknown."""
+    return ALIASES.get(normalize_unit(unit))
+
+
+def parse_amount(value):
+    """
+    Read an amount written as a number, a decimal string or a fraction.
+
+    "1 1/2", "1½" and "1,5" all give 1.5; of a range like "2-3" the lower
+    bound is kept. Raises ``ValueError`` for anything else.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid amount {value!r}")
+    text = value.strip()
+    for fraction, spelled in VULGAR_FRACTIONS.items():
+        text = text.replace(fraction, f' {spelled}')
+    match = AMOUNT.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid amount {value!r}")
+    amount = float(match['number'].replace(',', '.'))
+    if match['denominator']:
+        if not int(match['denominator']):
+            raise ValueError(f"Invalid amount {value!r}")
+        amount /= int(match['denominator'])
+    if match['whole']:
+        amount += int(match['whole'])
+    return amount
+
+
+def to_base(amount, unit):
+    """Return ``(base_amount, base_unit)`` for a quantity."""
+    known = lookup(unit)
+    if known is None:
+        return amount, normalize_unit(unit)
+    return amount * known.factor, known.base
+
+
+def sql_unit(column):
+    """SQL for ``normalize_unit`` of a unit column."""
+    return func.lower(func.trim(func.coalesce(column, '')))
+
+
+def sql_base(column):
+    """SQL for the base unit of a unit column, see ``to_base``."""
+    unit = sql_unit(column)
+    return case({alias: u.base for alias, u in ALIASES.items()},
+                value=unit, else_=unit)
+
+
+def sql_factor(column):
+    """SQL for the factor converting a unit column to its base unit."""
+    return case({alias: u.factor for alias, u in ALIASES.items()},
+                value=sql_unit(column), else_=literal(1.0))
+
+
+def readable(amount, base, smallest, largest):
+    """
+    Express ``amount`` of ``base`` in one of the units it was summed from.
+
+    ``smallest`` and ``largest`` are the conversion factors of the smallest
+    and largest unit seen: the total is given in the largest one when it
+    amounts to at least one of it, otherwise in the smallest.
+    """
+    factor = largest if amount >= largest else smallest
+    for unit in UNITS:
+        if unit.base == base and unit.factor == factor:
+            return amount / factor, unit.name
+    return amount, base
@@ -0,0 +1,192 @@
+"""
+Response encoding: JSON or MessagePack, optionally compressed.
+
+``app.json`` is replaced by a provider that encodes with orjson when it is
+installed (falling back to the standard library) and answers ``jsonify``
+with MessagePack instead when the client prefers it in ``Accept`` and
+``msgpack`` is installed. Objects the encoders do not know are looked up in
+``ENCODERS``, so a view can hand model instances straight to ``jsonify`` and
+each one is turned into a dict only when the encoder reaches it; see
+``app.serializers``.
+
+Bodies larger than ``COMPRESS_MIN_BYTES`` are compressed with brotli (when
+installed) or gzip, as ``Accept-Encoding`` allows. The response cache keeps
+the compressed variants it produced, so a cached response is compressed
+once rather than on every hit.
+"""
+import gzip
+import json
+import zlib
+from decimal import Decimal
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+JSON = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack',
+                 'application/vnd.msgpack')
+COMPRESSIBLE = (JSON, 'application/x-ndjson', 'text/csv', 'text/plain',
+                'text/html') + MSGPACK_TYPES
+COMPRESSED_STATUSES = (200, 201, 202)
+
+# type -> function returning something the encoders understand
+ENCODERS = {}
+
+
+def encodes(cls):
+    """Register the decorated function as the encoder of ``cls``."""
+    def decorator(fn):
+        ENCODERS[cls] = fn
+        return fn
+
+    return decorator
+
+
+def _default(obj):
+    encoder = ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not "
+                    f"serializable")
+
+
+def _stdlib_default(obj):
+    try:
+        return _default(obj)
+    except TypeError:
+        return DefaultJSONProvider.default(obj)
+
+
+def dumps_json(obj):
+    """Encode ``obj`` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_stdlib_default, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+def dumps_msgpack(obj):
+    return msgpack.packb(obj, default=_default)
+
+
+def negotiate():
+    """The mimetype to answer the current request with."""
+    if msgpack is None:
+        return JSON
+    # JSON comes first, so */* and a missing Accept header get JSON.
+    return request.accept_mimetypes.best_match((JSON,) + MSGPACK_TYPES,
+                                               default=JSON)
+
+
+def choose_encoding():
+    """The content encoding to compress the current response with."""
+    if not current_app.config['RESPONSE_COMPRESSION']:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(body, quality=config['BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """``app.json``, encoding with orjson and negotiating MessagePack."""
+
+    # used by the standard library encoder ``dumps`` falls back to
+    default = staticmethod(_stdlib_default)
+
+    def encode(self, obj, mimetype=JSON):
+        if mimetype in MSGPACK_TYPES:
+            return dumps_msgpack(obj)
+        return dumps_json(obj)
+
+    def dumps(self, obj, **kwargs):
+        # Options like indent or sort_keys are only known to the standard
+        # library encoder.
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        mimetype = negotiate()
+        response = self._app.response_class(self.encode(obj, mimetype),
+                                            mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        # Flushed per chunk so the client still gets the rows as they come.
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def configure_serialization(app):
+    """Install the ``JSONProvider`` as ``app.json``."""
+    app.json = JSONProvider(app)
+
+
+def configure_compression(app):
+    """Compress the responses that ``cache.cached`` did not already."""
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code not in COMPRESSED_STATUSES or \
+                response.direct_passthrough or \
+                'Content-Encoding' in response.headers or \
+                response.mimetype not in COMPRESSIBLE:
+            return response
+        encoding = choose_encoding()
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # Streams are gzipped on the fly, whatever else is accepted.
+            if not request.accept_encodings['gzip']:
+                return response
+            response.response = _gzip_stream(response.response,
+                                              app.config['GZIP_LEVEL'])
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+
+        body = response.get_data()
+        if len(body) < app.config['COMPRESS_MIN_BYTES']:
+            return response
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
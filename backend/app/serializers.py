@@ -0,0 +1,95 @@
+"""
+The JSON shapes of the models, shared by every endpoint.
+
+``jsonify`` encodes ``Recipe``, ``Ingredient`` and ``RecipeType`` instances
+with the summary functions registered here, so a view returns the objects
+themselves and no list of dicts is built before encoding starts.
+
+A client may ask for a subset of a recipe's fields; ``recipe_options`` then
+loads only the columns and relationships that ``sparse_recipe`` will read.
+"""
+from sqlalchemy.orm import load_only, selectinload
+
+from app.models import Ingredient, Recipe, RecipeIngredient, RecipeType
+from app.serialization import encodes
+
+RECIPE_COLUMNS = ('name', 'steps')
+RECIPE_RELATIONSHIPS = ('types', 'ingredients')
+
+
+@encodes(RecipeType)
+def recipe_type(recipe_type):
+    return {'id': recipe_type.id, 'name': recipe_type.name}
+
+
+@encodes(Ingredient)
+def ingredient(ingredient):
+    return {'id': ingredient.id, 'name': ingredient.name}
+
+
+@encodes(RecipeIngredient)
+def recipe_ingredient(recipe_ingredient):
+    """An ingredient with its quantity in one recipe."""
+    return {
+        'id': recipe_ingredient.ingredient.id,
+        'name': recipe_ingredient.ingredient.name,
+        'amount': recipe_ingredient.amount,
+        'unit': recipe_ingredient.unit,
+    }
+
+
+@encodes(Recipe)
+def recipe_summary(recipe):
+    """A recipe as listed: its ingredients without quantities."""
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'types': recipe.types,
+        'ingredients': [ri.ingredient for ri in recipe.ingredients],
+        'steps': recipe.steps,
+    }
+
+
+def recipe_options(columns=RECIPE_COLUMNS,
+                   relationships=RECIPE_RELATIONSHIPS, detail=False):
+    """
+    Loader options reading just what a recipe is serialized with.
+
+    Columns left out are not selected at all, relationships left out are
+    never loaded; the included ones take one query each for the whole
+    result, however many recipes it holds.
+    """
+    version = (Recipe.version,) if detail else ()
+    options = [load_only(Recipe.id, *version, *(getattr(Recipe, column)
+                                                for column in columns))]
+    if 'ingredients' in relationships:
+        quantity = (RecipeIngredient.amount, RecipeIngredient.unit) \
+            if detail else ()
+        options.append(
+            selectinload(Recipe.ingredients)
+            .load_only(RecipeIngredient.ingredient_id, *quantity)
+            .joinedload(RecipeIngredient.ingredient)
+        )
+    if 'types' in relationships:
+        options.append(selectinload(Recipe.types))
+    return options
+
+
+def sparse_recipe(recipe, columns, relationships, detail=False):
+    """
+    A recipe with only the given columns and relationships; in ``detail``
+    also its ``version``, which an edit has to send back.
+    """
+    data = {'id': recipe.id}
+    if detail:
+        data['version'] = recipe.version
+    if 'name' in columns:
+        data['name'] = recipe.name
+    if 'types' in relationships:
+        data['types'] = recipe.types
+    if 'ingredients' in relationships:
+        data['ingredients'] = recipe.ingredients if detail else \
+            [ri.ingredient for ri in recipe.ingredients]
+    if 'steps' in columns:
+        data['steps'] = recipe.steps
+    return data
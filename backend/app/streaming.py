@@ -0,0 +1,49 @@
+"""
+Incremental JSON and NDJSON responses for large collections.
+
+The items are serialized as they come out of a generator, typically a query
+run with ``yield_per`` so the database driver uses a server-side cursor, and
+written in small chunks. Neither the rows nor the output are ever held in
+memory as a whole, and the client gets the first bytes right away.
+"""
+from itertools import islice
+
+from flask import Response, current_app, stream_with_context
+
+STREAM_FORMATS = ('json', 'ndjson')
+# items serialized per chunk written to the client
+CHUNK_ITEMS = 200
+
+
+def _chunks(items):
+    items = iter(items)
+    while chunk := list(islice(items, CHUNK_ITEMS)):
+        yield chunk
+
+
+def streamed_response(key, items, stream_format):
+    """
+    Stream ``items`` as ``{"<key>": [...]}`` or as one JSON line per item.
+
+    ``items`` is consumed inside the request context, after the view has
+    returned.
+    """
+    dumps = current_app.json.dumps
+
+    def generate_json():
+        yield '{%s: [' % dumps(key)
+        separator = ''
+        for chunk in _chunks(items):
+            yield separator + ','.join(dumps(item) for item in chunk)
+            separator = ','
+        yield ']}'
+
+    def generate_ndjson():
+        for chunk in _chunks(items):
+            yield ''.join(dumps(item) + '\n' for item in chunk)
+
+    if stream_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()),
+                        mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json()),
+                    mimetype='application/json')
@@ -0,0 +1,25 @@
+"""
+Reproducible API benchmarks.
+
+Fills a fresh database with a seeded synthetic data set, drives every
+endpoint of the app through the Flask test client or over HTTP with
+concurrent clients, and writes latency percentiles, throughput, SQL query
+counts and peak memory per scenario to a JSON report::
+
+    python -m benchmarks run --scale 10k --seed 1 --output before.json
+    python -m benchmarks run --scale 10k --seed 1 --mode http \\
+        --concurrency 8 --output after.json
+    python -m benchmarks compare before.json after.json
+
+``python -m benchmarks serialization`` instead compares the response
+encoders, and their compressed sizes, on a page of recipes.
+
+The same scale and seed always produce the same rows and the same request
+sequence. Image extraction runs against ``FakeGroq``, a deterministic
+stand-in for the model API, so no network access or API key is needed;
+``--llm-latency`` and ``--llm-failure-rate`` make it slow and unreliable.
+
+``python -m benchmarks upstream --latency 2000 --failure-rate 0.3`` serves
+the same stand-in over HTTP, to run the real app and Groq SDK against with
+``GROQ_BASE_URL`` pointing at it.
+"""
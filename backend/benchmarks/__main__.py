@@ -0,0 +1,312 @@
+"""Command line entry point, see ``python -m benchmarks --help``."""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def _create_app(args):
+    # Config reads the environment when it is imported.
+    os.environ['DATABASE_URL'] = args.database
+    os.environ['DATABASE_REPLICA_URLS'] = ''
+    os.environ['EXTRACTION_CACHE_PATH'] = ''
+    os.environ['RESPONSE_CACHE'] = 'memory'
+    os.environ['JOB_QUEUE_SIZE'] = str(max(16, args.concurrency * 2))
+
+    from app import create_app
+
+    from benchmarks.fake_llm import FakeGroq
+
+    app = create_app()
+    app.extensions['llm_client'] = FakeGroq(
+        latency=args.llm_latency / 1000, chunk_size=args.llm_chunk_size,
+        failure_rate=args.llm_failure_rate, seed=args.seed
+    )
+    return app
+
+
+def _prepare_database(app, args):
+    from app import db
+    from app.models import Recipe
+    from app.recipes import documents
+
+    from benchmarks import generator
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Recipe.id).first() is not None:
+            sys.exit(f"{args.database} already holds recipes; "
+                     f"pass --reset to wipe it")
+        summary = generator.generate(generator.scale_size(args.scale),
+                                     seed=args.seed)
+        # As after "flask recipe rebuild-documents" on a deployment.
+        documents.rebuild()
+    names = generator.ingredient_names(summary['ingredients'])
+    return summary, names
+
+
+def _serve(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _setup(args):
+    if args.database is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='ingredify-bench-'),
+                            'benchmark.db')
+        args.database = f'sqlite:///{path}'
+
+    app = _create_app(args)
+    summary, names = _prepare_database(app, args)
+    print(f"Generated {summary['recipes']} recipes in "
+          f"{summary['seconds']}s", file=sys.stderr)
+    return app, summary, names
+
+
+def _write(report, path):
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+def run(args):
+    app, summary, names = _setup(args)
+
+    from benchmarks.runner import ClientDriver, HttpDriver, QueryCounter, \
+        run_scenario
+    from benchmarks.scenarios import SCENARIOS, Context
+
+    server = None
+    if args.mode == 'http':
+        server = _serve(app)
+        driver = HttpDriver(f'http://127.0.0.1:{server.server_port}')
+    else:
+        driver = ClientDriver(app)
+
+    selected = [scenario for scenario in SCENARIOS
+                if not args.only or scenario.name in args.only]
+    ctx = Context(summary, names, args.seed)
+    queries = QueryCounter(app)
+    results = {}
+    try:
+        for scenario in selected:
+            results[scenario.name] = run_scenario(
+                driver, scenario, ctx, args.requests, queries,
+                concurrency=args.concurrency if server else 1,
+            )
+            latency = results[scenario.name]['latency_ms']
+            print(f"{scenario.name:28} p50 {latency['p50']:>9} ms  "
+                  f"p95 {latency['p95']:>9} ms", file=sys.stderr)
+    finally:
+        queries.close()
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'scale': summary['recipes'],
+            'seed': args.seed,
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0],
+            'mode': args.mode,
+            'concurrency': args.concurrency if server else 1,
+            'requests': args.requests,
+            'llm_latency_ms': args.llm_latency,
+            'llm_failure_rate': args.llm_failure_rate,
+            'python': platform.python_version(),
+            'data': summary,
+            'max_rss_kb': resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss,
+        },
+        'scenarios': results,
+    }
+    _write(report, args.output)
+
+
+def serialization(args):
+    """Compare the response encoders on a page of recipes."""
+    from benchmarks.serialization import compare_encoders
+
+    app, summary, _ = _setup(args)
+    results = compare_encoders(app, args.page_size)
+    for name, result in results.items():
+        print(f"{name:10} {result['encode_ms']:>9} ms {result['bytes']:>9} B"
+              f"  gzip {result['gzip']['bytes']:>8} B", file=sys.stderr)
+    _write({
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'scale': summary['recipes'],
+            'seed': args.seed,
+            'page_size': args.page_size,
+            'python': platform.python_version(),
+        },
+        'encoders': results,
+    }, args.output)
+
+
+def upstream(args):
+    """Serve the stand-in model API until interrupted."""
+    from benchmarks.upstream import StandInUpstream
+
+    server = StandInUpstream(
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        failure_rate=args.failure_rate, failure_status=args.failure_status,
+        chunk_size=args.chunk_size, seed=args.seed,
+    ).make_server(args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving a stand-in model API on http://{host}:{port}, run the "
+          f"app with GROQ_BASE_URL=http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _change(before, after):
+    if not before or after is None:
+        return ''
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(args):
+    """Print the changes between two reports, exit 1 on a regression."""
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    for key in ('scale', 'database', 'mode', 'concurrency', 'llm_latency_ms',
+                'llm_failure_rate'):
+        if before['meta'].get(key) != after['meta'].get(key):
+            print(f"warning: the reports differ in {key} "
+                  f"({before['meta'].get(key)} / {after['meta'].get(key)})",
+                  file=sys.stderr)
+
+    regressed = []
+    print(f"{'scenario':28} {'p50 ms':>18} {'p95 ms':>18} "
+          f"{'rps':>18} {'queries':>12}")
+    for name, new in after['scenarios'].items():
+        old = before['scenarios'].get(name)
+        if old is None:
+            continue
+        cells = []
+        for key in ('p50', 'p95'):
+            a, b = old['latency_ms'][key], new['latency_ms'][key]
+            cells.append(f"{b:>9} {_change(a, b):>8}")
+        cells.append(f"{new['throughput_rps']:>9} "
+                     f"{_change(old['throughput_rps'], new['throughput_rps']):>8}")
+        cells.append(f"{old['queries_per_request']}->"
+                     f"{new['queries_per_request']}")
+        print(f"{name:28} " + " ".join(f"{cell:>18}" for cell in cells))
+
+        a, b = old['latency_ms']['p95'], new['latency_ms']['p95']
+        if a and b and (b - a) / a * 100 > args.threshold:
+            regressed.append(name)
+
+    if regressed:
+        print(f"p95 regressed by more than {args.threshold}%: "
+              f"{', '.join(regressed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    data_parser = argparse.ArgumentParser(add_help=False)
+    data_parser.add_argument('--scale', default='1k',
+                             help="1k, 10k, 100k or a number of recipes")
+    data_parser.add_argument('--seed', type=int, default=1)
+    data_parser.add_argument('--database',
+                             help="database URL, a temporary SQLite file "
+                                  "by default")
+    data_parser.add_argument('--reset', action='store_true',
+                             help="drop every table of --database first")
+    data_parser.add_argument('--output', help="write the report here")
+
+    run_parser = commands.add_parser('run', parents=[data_parser],
+                                     help="run the benchmarks")
+    run_parser.add_argument('--mode', choices=('client', 'http'),
+                            default='client')
+    run_parser.add_argument('--concurrency', type=int, default=8,
+                            help="concurrent clients in http mode")
+    run_parser.add_argument('--requests', type=int, default=200,
+                            help="requests per scenario")
+    run_parser.add_argument('--llm-latency', type=float, default=0,
+                            help="milliseconds the fake model sleeps per "
+                                 "call")
+    run_parser.add_argument('--llm-chunk-size', type=int, default=8,
+                            help="longest chunk of a streamed fake model "
+                                 "answer, in characters")
+    run_parser.add_argument('--llm-failure-rate', type=float, default=0,
+                            help="share of the fake model calls failing "
+                                 "with a 503")
+    run_parser.add_argument('--only', nargs='*',
+                            help="scenario names to run")
+    run_parser.set_defaults(handler=run)
+
+    serialization_parser = commands.add_parser(
+        'serialization', parents=[data_parser],
+        help="compare the response encoders")
+    serialization_parser.add_argument('--page-size', type=int, default=200)
+    serialization_parser.set_defaults(handler=serialization,
+                                      concurrency=1, llm_latency=0,
+                                      llm_chunk_size=8, llm_failure_rate=0)
+
+    upstream_parser = commands.add_parser(
+        'upstream', help="serve a stand-in model API with injected latency "
+                         "and failures")
+    upstream_parser.add_argument('--host', default='127.0.0.1')
+    upstream_parser.add_argument('--port', type=int, default=8300)
+    upstream_parser.add_argument('--latency', type=float, default=1000,
+                                 help="milliseconds slept per call")
+    upstream_parser.add_argument('--jitter', type=float, default=0,
+                                 help="up to this many more milliseconds, "
+                                      "at random")
+    upstream_parser.add_argument('--failure-rate', type=float, default=0,
+                                 help="share of the calls failing")
+    upstream_parser.add_argument('--failure-status', type=int, default=503,
+                                 help="HTTP status of the failures")
+    upstream_parser.add_argument('--chunk-size', type=int, default=8,
+                                 help="longest chunk of a streamed answer")
+    upstream_parser.add_argument('--seed', type=int, default=1)
+    upstream_parser.set_defaults(handler=upstream)
+
+    compare_parser = commands.add_parser('compare',
+                                         help="compare two reports")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=10,
+                                help="p95 regression in percent that "
+                                     "fails the comparison")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    args.handler(args)
+    print(f"Done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
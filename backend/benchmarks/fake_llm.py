@@ -0,0 +1,117 @@
+"""Deterministic stand-in for the Groq chat completion client."""
+import json
+import random
+import threading
+import time
+from hashlib import sha256
+from types import SimpleNamespace
+
+from benchmarks.generator import INGREDIENT_NOUNS, UNITS
+
+
+class FakeAPIError(Exception):
+    """An injected upstream failure, shaped like the Groq SDK's errors."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Injected upstream failure ({status_code})")
+        self.status_code = status_code
+
+
+class FakeGroq:
+    """
+    Answers ``chat.completions.create`` like the Groq client would.
+
+    The reply depends only on the request, so the same image always reads
+    as the same recipe; ``latency`` seconds are slept per call to stand in
+    for the time spent upstream.
+
+    With ``stream=True`` the reply comes as chunks of 1 to ``chunk_size``
+    characters, cut at seeded random places so that over many calls every
+    kind of boundary occurs: inside keys, escapes, numbers and between
+    values. The latency is then spread over the chunks. Streamed
+    structuring answers are wrapped in a code fence, as models without
+    JSON mode tend to do.
+
+    A ``failure_rate`` share of the calls, drawn from a generator seeded
+    with ``seed``, fail with ``FakeAPIError(failure_status)`` after the
+    latency, like an overloaded upstream.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=8, failure_rate=0.0,
+                 failure_status=503, seed=1):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.calls = 0
+        self.failures = 0
+        self._faults = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create)
+        )
+
+    def _reply(self, content):
+        return SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=content))
+        ])
+
+    def _stream(self, content, rng):
+        pieces = []
+        while content:
+            size = rng.randint(1, self.chunk_size)
+            pieces.append(content[:size])
+            content = content[size:]
+        for piece in pieces + [None]:
+            if self.latency:
+                time.sleep(self.latency / len(pieces))
+            yield SimpleNamespace(choices=[
+                SimpleNamespace(delta=SimpleNamespace(content=piece))
+            ])
+
+    def create(self, model, messages, response_format=None, stream=False,
+               **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self._faults.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if failed:
+            time.sleep(self.latency)
+            raise FakeAPIError(self.failure_status)
+        prompt = json.dumps(messages, sort_keys=True)
+        rng = random.Random(sha256(prompt.encode()).digest())
+        content = self._content(messages, rng)
+        if stream:
+            if not isinstance(messages[0]['content'], list):
+                content = f"```json\n{content}\n```"
+            return self._stream(content, rng)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(content)
+
+    def _content(self, messages, rng):
+        # Only the OCR request carries an image.
+        if isinstance(messages[0]['content'], list):
+            lines = [f"{rng.choice(INGREDIENT_NOUNS).title()} "
+                     f"{rng.choice(['Soup', 'Stew', 'Bake', 'Salad'])}"]
+            for noun in rng.sample(INGREDIENT_NOUNS, rng.randint(3, 10)):
+                lines.append(f"{rng.randint(1, 500)} {rng.choice(UNITS)} "
+                             f"{noun}")
+            lines.append("Mix everything and cook until done.")
+            return "\n".join(lines)
+
+        recipe = {
+            "recipe": {
+                "name": 'Synthetic "House" Recipe',
+                "types": [{"id": 1, "name": ""}],
+                "ingredients": [{
+                    "name": noun,
+                    "amount": str(rng.randint(1, 500)),
+                    "unit": rng.choice(UNITS),
+                } for noun in rng.sample(INGREDIENT_NOUNS,
+                                         rng.randint(3, 10))],
+                "steps": "Mix everything.\nCook until done.",
+            }
+        }
+        return json.dumps(recipe)
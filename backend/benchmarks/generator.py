@@ -0,0 +1,164 @@
+"""
+Seeded synthetic data for the benchmarks.
+
+``generate`` always produces the same categories, types, ingredients and
+recipes for the same scale and seed. Ingredient popularity follows a Zipf
+like curve, so a few staples appear in most recipes and the long tail in
+very few, which is what makes pantry, similarity and shopping list queries
+behave like they do on real data.
+"""
+import random
+import time
+
+from app import db
+from app.models import Ingredient, IngredientCategory, Recipe, \
+    RecipeIngredient, RecipeType, recipe_type_association
+from app.recipes import search as recipe_search
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+CATEGORIES = [
+    "Vegetables", "Fruit", "Dairy", "Meat", "Fish", "Grains", "Spices",
+    "Herbs", "Oils", "Baking", "Nuts", "Other",
+]
+RECIPE_TYPES = [
+    "Breakfast", "Lunch", "Dinner", "Dessert", "Snack", "Soup", "Salad",
+    "Drink",
+]
+INGREDIENT_NOUNS = [
+    "tomato", "onion", "garlic", "potato", "carrot", "pepper", "cucumber",
+    "spinach", "broccoli", "cabbage", "zucchini", "eggplant", "mushroom",
+    "apple", "banana", "lemon", "orange", "strawberry", "blueberry", "mango",
+    "milk", "butter", "cheese", "yogurt", "cream", "egg", "chicken", "beef",
+    "pork", "lamb", "salmon", "tuna", "shrimp", "rice", "flour", "oats",
+    "pasta", "bread", "quinoa", "salt", "sugar", "cinnamon", "cumin",
+    "paprika", "basil", "parsley", "thyme", "rosemary", "olive oil",
+    "honey", "vinegar", "almond", "walnut", "peanut", "lentil", "chickpea",
+    "bean", "corn", "pea", "coconut",
+]
+QUALIFIERS = [
+    "", "fresh", "dried", "smoked", "red", "green", "yellow", "wild",
+    "organic", "roasted", "frozen", "ground", "sweet", "baby", "black",
+    "white", "spicy", "pickled", "toasted", "raw",
+]
+UNITS = ["g", "kg", "ml", "l", "tsp", "tbsp", "cup", "pinch", "clove", ""]
+DISHES = ["soup", "stew", "salad", "bake", "pie", "curry", "stir fry",
+          "risotto", "pancakes", "smoothie", "roast", "tart"]
+STEP_VERBS = ["Chop", "Mix", "Boil", "Fry", "Bake", "Stir", "Season",
+              "Simmer", "Whisk", "Grill", "Serve"]
+
+BATCH_SIZE = 5000
+
+
+def scale_size(scale):
+    """Number of recipes for ``scale``: '1k', '10k', '100k' or an int."""
+    if isinstance(scale, int):
+        return scale
+    if scale in SCALES:
+        return SCALES[scale]
+    return int(scale)
+
+
+def ingredient_names(count):
+    names = []
+    for qualifier in QUALIFIERS:
+        for noun in INGREDIENT_NOUNS:
+            names.append(f"{qualifier} {noun}".strip())
+    n = 2
+    while len(names) < count:
+        names.extend(f"{noun} {n}" for noun in INGREDIENT_NOUNS)
+        n += 1
+    return names[:count]
+
+
+def _batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def _reset_sequences():
+    # Rows were inserted with explicit ids, which Postgres sequences do not
+    # see; move them past the generated rows so later inserts still work.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in ('ingredient_category', 'recipe_type', 'ingredient',
+                  'recipe'):
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT max(id) FROM {table}))"
+        ))
+
+
+def generate(recipes, seed=1):
+    """
+    Fill the empty database of the current app with ``recipes`` recipes.
+
+    Returns a summary with the row counts and the seconds it took.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    n_ingredients = max(200, min(5000, recipes // 20))
+    names = ingredient_names(n_ingredients)
+    weights = [1 / (rank ** 0.9) for rank in range(1, n_ingredients + 1)]
+
+    db.session.execute(db.insert(IngredientCategory), [
+        {'id': i, 'name': name} for i, name in enumerate(CATEGORIES, 1)
+    ])
+    db.session.execute(db.insert(RecipeType), [
+        {'id': i, 'name': name} for i, name in enumerate(RECIPE_TYPES, 1)
+    ])
+    for batch in _batches([{
+        'id': i,
+        'name': name,
+        'category_id': rng.randint(1, len(CATEGORIES)),
+    } for i, name in enumerate(names, 1)]):
+        db.session.execute(db.insert(Ingredient), batch)
+
+    ingredient_ids = range(1, n_ingredients + 1)
+    recipe_rows, ingredient_rows, type_rows = [], [], []
+    for recipe_id in range(1, recipes + 1):
+        chosen = set(rng.choices(ingredient_ids, weights,
+                                 k=rng.randint(4, 14)))
+        main = names[min(chosen) - 1]
+        recipe_rows.append({
+            'id': recipe_id,
+            'name': f"{main.title()} {rng.choice(DISHES)} {recipe_id}",
+            'source': '',
+            'steps': "\n".join(
+                f"{rng.choice(STEP_VERBS)} the "
+                f"{names[rng.choice(list(chosen)) - 1]}."
+                for _ in range(rng.randint(3, 8))
+            ),
+        })
+        ingredient_rows.extend({
+            'recipe_id': recipe_id,
+            'ingredient_id': ingredient_id,
+            'amount': float(rng.randint(1, 500)),
+            'unit': rng.choice(UNITS),
+        } for ingredient_id in sorted(chosen))
+        type_rows.extend({
+            'recipe_id': recipe_id,
+            'type_id': type_id,
+        } for type_id in rng.sample(range(1, len(RECIPE_TYPES) + 1),
+                                    rng.randint(1, 2)))
+
+    for batch in _batches(recipe_rows):
+        db.session.execute(db.insert(Recipe), batch)
+    for batch in _batches(ingredient_rows):
+        db.session.execute(db.insert(RecipeIngredient), batch)
+    for batch in _batches(type_rows):
+        db.session.execute(recipe_type_association.insert(), batch)
+    _reset_sequences()
+    for start in range(1, recipes + 1, BATCH_SIZE):
+        recipe_search.index_recipes(
+            range(start, min(start + BATCH_SIZE, recipes + 1))
+        )
+    db.session.commit()
+
+    return {
+        'recipes': recipes,
+        'ingredients': n_ingredients,
+        'recipe_ingredients': len(ingredient_rows),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
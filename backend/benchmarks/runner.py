@@ -0,0 +1,215 @@
+"""
+Drive the scenarios and collect their measurements.
+
+Two drivers send the same requests: ``ClientDriver`` goes through the
+Flask test client, in process and one request at a time, and measures the
+app itself; ``HttpDriver`` goes through a real threaded HTTP server and is
+used by the concurrent load mode. SQL statements are counted with engine
+events on every bind, peak memory with ``tracemalloc`` during a separate
+pass so its overhead never shows up in the latencies.
+"""
+import io
+import threading
+import time
+import tracemalloc
+import uuid
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
+
+from sqlalchemy import event
+
+from app import db
+
+JOB_POLL_INTERVAL = 0.005
+# requests per scenario measured under tracemalloc
+MEMORY_SAMPLES = 3
+
+
+class QueryCounter:
+    """Count the statements run on every engine of the app."""
+
+    def __init__(self, app):
+        self.count = 0
+        self._lock = threading.Lock()
+        with app.app_context():
+            self.engines = list(db.engines.values())
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+    def close(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._count)
+
+
+def _multipart(fields):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\n'.encode())
+        if isinstance(value, tuple):
+            content, filename = value
+            body.write(
+                f'Content-Disposition: form-data; name="{name}"; '
+                f'filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+            )
+        else:
+            content = str(value).encode()
+            body.write(
+                f'Content-Disposition: form-data; name="{name}"'
+                f'\r\n\r\n'.encode()
+            )
+        body.write(content + b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class ClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, json=None, data=None, content_type=None):
+        if isinstance(data, dict):
+            data = {
+                name: (io.BytesIO(value[0]), value[1])
+                if isinstance(value, tuple) else value
+                for name, value in data.items()
+            }
+        response = self.client.open(path, method=method, json=json,
+                                    data=data, content_type=content_type)
+        return response.status_code, response.get_data(), \
+            response.headers.get('Location')
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def send(self, method, path, json=None, data=None, content_type=None):
+        headers = {}
+        if json is not None:
+            data = dumps(json).encode()
+            content_type = 'application/json'
+        elif isinstance(data, dict):
+            data, content_type = _multipart(data)
+        if content_type:
+            headers['Content-Type'] = content_type
+        request = urllib.request.Request(self.base_url + path, data=data,
+                                         method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, response.read(), \
+                    response.headers.get('Location')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), None
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1,
+                      round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _run_one(driver, scenario, ctx, request):
+    """Send one request of ``scenario``; returns (seconds, status) or None."""
+    if request is None:
+        return None
+    started = time.perf_counter()
+    status, body, location = driver.send(*request)
+    if scenario.job and status in (200, 202):
+        job = loads(body)['job']
+        while job['status'] in ('queued', 'running'):
+            time.sleep(JOB_POLL_INTERVAL)
+            status, body, _ = driver.send(
+                'GET', location or f"/api/recipes/process-image/{job['id']}"
+            )
+            job = loads(body)['job']
+        if job['status'] != 'done':
+            status = f"job {job['status']}"
+    if scenario.check is not None and status == 200 and \
+            not scenario.check(body):
+        status = 'check failed'
+    elapsed = time.perf_counter() - started
+    if scenario.after is not None and isinstance(status, int) \
+            and status < 400:
+        scenario.after(ctx, loads(body))
+    return elapsed, status
+
+
+def run_scenario(driver, scenario, ctx, requests, queries, concurrency=1):
+    """Measure ``requests`` requests of ``scenario``."""
+    count = max(1, int(requests * scenario.share))
+
+    warmup = _run_one(driver, scenario, ctx, scenario.make(ctx))
+    queries.take()
+
+    # Built up front, so the seeded sequence of requests does not depend
+    # on how the threads get scheduled.
+    batch = [scenario.make(ctx) for _ in range(count)]
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(
+                lambda request: _run_one(driver, scenario, ctx, request),
+                batch
+            ))
+    else:
+        results = [_run_one(driver, scenario, ctx, request)
+                   for request in batch]
+    wall = time.perf_counter() - started
+    statements = queries.take()
+
+    results = [result for result in results if result is not None]
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+    statuses = Counter(str(status) for _, status in results)
+    errors = sum(n for status, n in statuses.items()
+                 if not status.startswith(('2', '3')))
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_SAMPLES):
+            tracemalloc.reset_peak()
+            if _run_one(driver, scenario, ctx,
+                        scenario.make(ctx)) is not None:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    queries.take()
+
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'status': dict(statuses),
+        'warmup_ms': round(warmup[0] * 1000, 2) if warmup else None,
+        'latency_ms': {
+            'p50': _round(_percentile(latencies, 50)),
+            'p95': _round(_percentile(latencies, 95)),
+            'p99': _round(_percentile(latencies, 99)),
+            'mean': _round(sum(latencies) / len(latencies)
+                           if latencies else None),
+            'max': _round(latencies[-1] if latencies else None),
+        },
+        'throughput_rps': round(len(results) / wall, 2) if wall else None,
+        'queries_per_request': round(statements / len(results), 2)
+        if results else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
@@ -0,0 +1,240 @@
+"""
+One scenario per endpoint, each producing a seeded stream of requests.
+
+A scenario turns the shared ``Context`` into the next request to send.
+Write scenarios keep track of what they created so that ``recipes.edit``
+and ``recipes.delete`` only ever touch benchmark-made recipes and the
+generated data set stays the same from one scenario to the next.
+"""
+import io
+import json
+import random
+from collections import namedtuple
+
+from PIL import Image
+
+from benchmarks.generator import DISHES, RECIPE_TYPES, UNITS
+
+# ``data`` is raw bytes, or a dict of form fields whose values may be
+# ``(bytes, filename)`` file uploads
+Request = namedtuple('Request', 'method path json data content_type',
+                     defaults=(None, None, None))
+
+
+class Context:
+    def __init__(self, summary, names, seed):
+        self.rng = random.Random(seed)
+        self.recipes = summary['recipes']
+        self.ingredients = summary['ingredients']
+        self.names = names
+        self.created = []
+        self.added_ingredients = 0
+
+    def recipe_id(self):
+        return self.rng.randint(1, self.recipes)
+
+    def ingredient_ids(self, k):
+        # Skewed to the popular end, like real pantries.
+        top = max(k, self.ingredients // 10)
+        return self.rng.sample(range(1, top + 1), k)
+
+    def recipe_payload(self):
+        return {
+            'name': f"Benchmark {self.rng.choice(DISHES)}",
+            'steps': "Mix.\nCook.\nServe.",
+            'types': [self.rng.randint(1, len(RECIPE_TYPES))],
+            'ingredients': [{
+                'id': ingredient_id,
+                'name': self.names[ingredient_id - 1],
+                'amount': self.rng.randint(1, 500),
+                'unit': self.rng.choice([u for u in UNITS if u]),
+            } for ingredient_id in self.ingredient_ids(self.rng.randint(4, 10))],
+        }
+
+    def image(self):
+        image = Image.new('RGB', (1200, 900), tuple(
+            self.rng.randint(0, 255) for _ in range(3)
+        ))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+        return buffer.getvalue()
+
+
+class Scenario:
+    """
+    ``make(ctx)`` returns the next ``Request``. ``share`` scales the number
+    of requests for heavy scenarios; ``job`` scenarios are timed until the
+    background job they start has finished. ``check(body)`` validates a
+    successful response; a failed check counts as an error.
+    """
+
+    def __init__(self, name, make, share=1.0, job=False, after=None,
+                 check=None):
+        self.name = name
+        self.make = make
+        self.share = share
+        self.job = job
+        self.after = after
+        self.check = check
+
+
+def _created(ctx, body):
+    recipe_id = (body or {}).get('recipe_id')
+    if recipe_id is not None:
+        ctx.created.append(recipe_id)
+
+
+def _add_ingredient(ctx):
+    # Half of the requests hit an existing name, which must not duplicate.
+    if ctx.rng.random() < 0.5:
+        name = ctx.names[ctx.rng.randint(1, ctx.ingredients) - 1]
+    else:
+        ctx.added_ingredients += 1
+        name = f"benchmark ingredient {ctx.added_ingredients}"
+    return Request('POST', '/api/ingredients/add', {'name': name})
+
+
+def _edit_recipe(ctx):
+    recipe_id = ctx.rng.choice(ctx.created) if ctx.created else None
+    if recipe_id is None:
+        return None
+    return Request('PUT', f'/api/recipes/edit/{recipe_id}',
+                   ctx.recipe_payload())
+
+
+def _patch_steps(ctx):
+    # The common edit: a typo fixed in the steps, nothing else touched.
+    recipe_id = ctx.rng.choice(ctx.created) if ctx.created else None
+    if recipe_id is None:
+        return None
+    return Request('PATCH', f'/api/recipes/edit/{recipe_id}', {
+        'steps': f"Mix.\nCook {ctx.rng.randint(5, 60)} minutes.\nServe."
+    })
+
+
+def _delete_recipe(ctx):
+    if not ctx.created:
+        return None
+    return Request('DELETE', f'/api/recipes/delete/{ctx.created.pop()}')
+
+
+def _import(ctx):
+    lines = []
+    for _ in range(100):
+        payload = ctx.recipe_payload()
+        payload['types'] = [RECIPE_TYPES[payload['types'][0] - 1]]
+        lines.append(json.dumps(payload))
+    return Request('POST', '/api/recipes/import?batch_size=50',
+                   data="\n".join(lines).encode(),
+                   content_type='application/x-ndjson')
+
+
+def _image_upload(path):
+    return lambda ctx: Request('POST', path, data={
+        'image': (ctx.image(), 'recipe.jpg')
+    }, content_type='multipart/form-data')
+
+
+def _events(body):
+    events = []
+    for block in body.decode().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines()
+                     if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def _check_image_stream(body):
+    """What was streamed piece by piece adds up to the final result."""
+    events = _events(body)
+    if not events or events[-1][0] != 'result':
+        return False
+    result = events[-1][1]
+    streamed = {}
+    tokens = []
+    for event, data in events:
+        if event == 'ocr_token':
+            tokens.append(data['text'])
+        elif event == 'ocr' and not data['cached'] and \
+                ''.join(tokens) != data['text']:
+            return False
+        elif event == 'ingredient':
+            streamed.setdefault('ingredients', []).append(data['ingredient'])
+        elif event in ('name', 'types', 'steps'):
+            streamed[event] = data[event]
+    if result['cached']['recipe']:
+        return True
+    return streamed == result['recipe']
+
+
+def _shopping_list(ctx):
+    return Request('POST', '/api/recipes/shopping-list', {'recipes': [
+        {'id': ctx.recipe_id(), 'multiplier': ctx.rng.choice([0.5, 1, 2])}
+        for _ in range(10)
+    ]})
+
+
+def _search(ctx):
+    name = ctx.names[ctx.rng.randint(1, min(ctx.ingredients, 200)) - 1]
+    return Request('GET', f'/api/recipes/search?q={name.split()[-1]}'
+                          f'+{ctx.rng.choice(DISHES).split()[0]}')
+
+
+def _suggest(ctx):
+    name = ctx.names[ctx.rng.randint(1, ctx.ingredients) - 1]
+    return Request('GET', '/api/ingredients/suggest?prefix='
+                          + name[:ctx.rng.randint(1, 4)].replace(' ', '+'))
+
+
+SCENARIOS = [
+    Scenario('types.list', lambda ctx: Request('GET', '/api/types/')),
+    Scenario('ingredients.list',
+             lambda ctx: Request('GET', '/api/ingredients/')),
+    Scenario('ingredients.stream',
+             lambda ctx: Request('GET', '/api/ingredients/?stream=ndjson'),
+             share=0.25),
+    Scenario('ingredients.suggest', _suggest),
+    Scenario('ingredients.add', _add_ingredient),
+    Scenario('recipes.list', lambda ctx: Request(
+        'GET', f'/api/recipes/?limit=50&after={ctx.recipe_id() - 1}'
+    )),
+    # What the frontend's list page asks for.
+    Scenario('recipes.list_sparse', lambda ctx: Request(
+        'GET', f'/api/recipes/?limit=50&after={ctx.recipe_id() - 1}'
+        '&fields=name&include=types'
+    )),
+    # Streams the last 1000 recipes, whatever the scale.
+    Scenario('recipes.stream', lambda ctx: Request(
+        'GET', f'/api/recipes/?stream=ndjson&after={max(0, ctx.recipes - 1000)}'
+    ), share=0.1),
+    Scenario('recipes.export', lambda ctx: Request(
+        'GET', f'/api/recipes/export?format={ctx.rng.choice(["ndjson", "csv"])}'
+               f'&after={max(0, ctx.recipes - 5000)}'
+    ), share=0.1),
+    Scenario('recipes.get',
+             lambda ctx: Request('GET', f'/api/recipes/{ctx.recipe_id()}')),
+    Scenario('recipes.cook', lambda ctx: Request(
+        'GET', '/api/recipes/cook?limit=20&ingredients='
+        + ','.join(map(str, ctx.ingredient_ids(ctx.rng.randint(3, 12))))
+    )),
+    Scenario('recipes.search', _search),
+    Scenario('recipes.similar', lambda ctx: Request(
+        'GET', f'/api/recipes/{ctx.recipe_id()}/similar'
+               f'?same_type={ctx.rng.randint(0, 1)}'
+    )),
+    Scenario('recipes.shopping_list', _shopping_list),
+    Scenario('recipes.add', lambda ctx: Request(
+        'POST', '/api/recipes/add', ctx.recipe_payload()
+    ), after=_created),
+    Scenario('recipes.edit', _edit_recipe),
+    Scenario('recipes.patch_steps', _patch_steps),
+    Scenario('recipes.import', _import, share=0.05),
+    Scenario('recipes.process_image', _image_upload(
+        '/api/recipes/process-image'
+    ), share=0.25, job=True),
+    Scenario('recipes.process_image_stream', _image_upload(
+        '/api/recipes/process-image/stream'
+    ), share=0.25, check=_check_image_stream),
+    Scenario('recipes.delete', _delete_recipe),
+]
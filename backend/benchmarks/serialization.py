@@ -0,0 +1,86 @@
+"""
+Encode the same pages of recipes every way the app can answer them.
+
+``baseline`` is how responses were produced before ``app.serialization``:
+nested dicts built by hand and Flask's standard library provider with
+sorted keys. The other encoders get the model instances themselves. Each
+body is also compressed with gzip and, when installed, brotli, at the
+levels the app is configured with, to compare time and bytes on the wire.
+"""
+import gzip
+import time
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import selectinload
+
+from app.models import Recipe, RecipeIngredient
+from app.serialization import brotli, dumps_json, dumps_msgpack, msgpack, \
+    orjson
+
+REPEAT = 20
+
+
+def _baseline_summary(recipe):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'types': [{'id': rt.id, 'name': rt.name} for rt in recipe.types],
+        'ingredients': [{'id': ri.ingredient.id, 'name': ri.ingredient.name}
+                        for ri in recipe.ingredients],
+        'steps': recipe.steps,
+    }
+
+
+def _best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def _measure(encode, config):
+    body, encode_ms = _best_of(encode)
+    result = {'encode_ms': round(encode_ms, 3), 'bytes': len(body)}
+    compressed, ms = _best_of(
+        lambda: gzip.compress(body, compresslevel=config['GZIP_LEVEL'])
+    )
+    result['gzip'] = {'ms': round(ms, 3), 'bytes': len(compressed)}
+    if brotli is not None:
+        compressed, ms = _best_of(
+            lambda: brotli.compress(body, quality=config['BROTLI_QUALITY'])
+        )
+        result['br'] = {'ms': round(ms, 3), 'bytes': len(compressed)}
+    return result
+
+
+def compare_encoders(app, page_size):
+    """Return the measurements of every encoder on a page of recipes."""
+    with app.test_request_context():
+        recipes = (
+            Recipe.query
+            .options(selectinload(Recipe.ingredients)
+                     .joinedload(RecipeIngredient.ingredient),
+                     selectinload(Recipe.types))
+            .order_by(Recipe.id)
+            .limit(page_size)
+            .all()
+        )
+        baseline = DefaultJSONProvider(app)
+        encoders = {
+            'baseline': lambda: baseline.response({
+                'recipes': [_baseline_summary(r) for r in recipes],
+                'next': None,
+            }).get_data(),
+            'json': lambda: dumps_json({'recipes': recipes, 'next': None}),
+        }
+        if msgpack is not None:
+            encoders['msgpack'] = lambda: dumps_msgpack(
+                {'recipes': recipes, 'next': None}
+            )
+        results = {name: _measure(encode, app.config)
+                   for name, encode in encoders.items()}
+    results['json']['encoder'] = 'orjson' if orjson is not None else 'json'
+    return results
@@ -0,0 +1,111 @@
+"""
+A local stand-in for the Groq API, to exercise the app's model client.
+
+It answers ``POST /openai/v1/chat/completions`` (the path the Groq SDK
+calls) with ``FakeGroq``'s recipes, in JSON or as the server-sent event
+stream the SDK reads with ``stream=True``, after an injected latency and
+failing the configured share of the calls. Point the app at it with
+``GROQ_BASE_URL=http://127.0.0.1:<port>`` and any ``GROQ_API_KEY``.
+
+The latency is drawn uniformly between ``latency`` and ``latency +
+jitter`` per call, so timeouts and the breaker's slow-call rule can be
+triggered as well as errors.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_llm import FakeAPIError, FakeGroq
+
+COMPLETIONS_PATH = '/openai/v1/chat/completions'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # set on the subclass made by ``make_server``
+    upstream = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != COMPLETIONS_PATH:
+            self._send(404, b'{"error": {"message": "Not found"}}')
+            return
+        request = json.loads(self.rfile.read(
+            int(self.headers.get('Content-Length', 0))
+        ))
+        self.upstream.wait()
+        try:
+            reply = self.upstream.fake.create(
+                model=request['model'], messages=request['messages'],
+                stream=request.get('stream', False)
+            )
+        except FakeAPIError as e:
+            self._send(e.status_code, json.dumps(
+                {'error': {'message': str(e), 'type': 'server_error'}}
+            ).encode())
+            return
+
+        completion = {'id': 'chatcmpl-stand-in', 'created': int(time.time()),
+                      'model': request['model']}
+        if not request.get('stream'):
+            content = reply.choices[0].message.content
+            self._send(200, json.dumps(dict(
+                completion, object='chat.completion', choices=[{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': content},
+                }]
+            )).encode())
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in reply:
+            content = chunk.choices[0].delta.content
+            delta = {'content': content} if content is not None else {}
+            self._write_chunk(json.dumps(dict(
+                completion, object='chat.completion.chunk', choices=[{
+                    'index': 0, 'delta': delta,
+                    'finish_reason': None if content is not None else 'stop',
+                }]
+            )))
+        self._write_chunk('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data):
+        event = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(event):x}\r\n".encode() + event + b'\r\n')
+        self.wfile.flush()
+
+
+class StandInUpstream:
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 failure_status=503, chunk_size=8, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        # The per-call latency is slept here, not by the fake.
+        self.fake = FakeGroq(chunk_size=chunk_size, failure_rate=failure_rate,
+                             failure_status=failure_status, seed=seed)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        time.sleep(delay)
+
+    def make_server(self, host='127.0.0.1', port=0):
+        handler = type('Handler', (_Handler,), {'upstream': self})
+        return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,28 @@
+"""Add recipe version for optimistic concurrency
+
+Revision ID: a4d9e2c6b8f1
+Revises: f1c7b3e9a2d6
+Create Date: 2026-10-18 20:41:09.217356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d9e2c6b8f1'
+down_revision = 'f1c7b3e9a2d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The server default fills existing rows without rewriting them one by
+    # one.
+    op.add_column('recipe', sa.Column('version', sa.Integer(),
+                                      server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,33 @@
+"""Add recipe document table
+
+Revision ID: b6e1f4a9c3d7
+Revises: a4d9e2c6b8f1
+Create Date: 2026-10-18 21:27:53.604128
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1f4a9c3d7'
+down_revision = 'a4d9e2c6b8f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left empty: fill it with "flask recipe rebuild-documents". Until then
+    # recipe details are built from the tables as before.
+    op.create_table(
+        'recipe_document',
+        sa.Column('recipe_id', sa.Integer(), nullable=False),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('recipe_id')
+    )
+
+
+def downgrade():
+    op.drop_table('recipe_document')
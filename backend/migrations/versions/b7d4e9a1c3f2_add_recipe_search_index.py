@@ -0,0 +1,62 @@
+"""Add recipe full-text search index
+
+Revision ID: b7d4e9a1c3f2
+Revises: 62cced5b51ba
+Create Date: 2026-10-18 14:02:11.418230
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e9a1c3f2'
+down_revision = '62cced5b51ba'
+branch_labels = None
+depends_on = None
+
+
+DOCUMENTS = """
+    SELECT recipe.id AS id, recipe.name AS name, recipe.steps AS steps,
+           coalesce({aggregate}(i.name, ' '), '') AS ingredients
+    FROM recipe
+    LEFT JOIN recipe_ingredient ri ON ri.recipe_id = recipe.id
+    LEFT JOIN ingredient i ON i.id = ri.ingredient_id
+    GROUP BY recipe.id
+"""
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("ALTER TABLE recipe ADD COLUMN search_vector tsvector")
+        op.execute(
+            "UPDATE recipe SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(doc.name, '')), 'A') "
+            "|| setweight(to_tsvector('english', doc.ingredients), 'B') "
+            "|| setweight(to_tsvector('english', coalesce(doc.steps, '')), "
+            "'C') FROM (" + DOCUMENTS.format(aggregate='string_agg') +
+            ") AS doc WHERE recipe.id = doc.id"
+        )
+        op.create_index('ix_recipe_search_vector', 'recipe',
+                        ['search_vector'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE recipe_fts USING "
+            "fts5(name, ingredients, steps, tokenize='porter unicode61')"
+        )
+        op.execute(
+            "INSERT INTO recipe_fts (rowid, name, ingredients, steps) "
+            "SELECT id, name, ingredients, steps FROM ("
+            + DOCUMENTS.format(aggregate='group_concat') + ")"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.drop_index('ix_recipe_search_vector', table_name='recipe')
+        op.drop_column('recipe', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE recipe_fts")
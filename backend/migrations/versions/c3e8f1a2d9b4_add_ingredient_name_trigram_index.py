@@ -0,0 +1,33 @@
+"""Add ingredient name trigram index
+
+Revision ID: c3e8f1a2d9b4
+Revises: b7d4e9a1c3f2
+Create Date: 2026-10-18 15:27:40.902114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f1a2d9b4'
+down_revision = 'b7d4e9a1c3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only PostgreSQL has pg_trgm; other backends serve suggestions from the
+    # in-process index.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX ix_ingredient_name_trgm ON ingredient "
+        "USING gin (lower(name) gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX ix_ingredient_name_trgm")
@@ -0,0 +1,78 @@
+"""Index join tables and make ingredient names unique
+
+Revision ID: d5f2a8c7e1b3
+Revises: c3e8f1a2d9b4
+Create Date: 2026-10-18 16:48:05.227391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f2a8c7e1b3'
+down_revision = 'c3e8f1a2d9b4'
+branch_labels = None
+depends_on = None
+
+
+def merge_duplicate_ingredients():
+    """
+    Fold ingredients whose names only differ in case into the oldest one.
+
+    The recipe rows of every duplicate are repointed to the kept ingredient,
+    which also inherits a category when it had none.
+    """
+    op.create_table(
+        'ingredient_merge',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('keep', sa.Integer(), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO ingredient_merge (id, keep) "
+        "SELECT i.id, k.keep FROM ingredient i "
+        "JOIN (SELECT lower(name) AS name, min(id) AS keep FROM ingredient "
+        "GROUP BY lower(name) HAVING count(*) > 1) k "
+        "ON lower(i.name) = k.name WHERE i.id <> k.keep"
+    )
+    op.execute(
+        "UPDATE recipe_ingredient SET ingredient_id = "
+        "(SELECT keep FROM ingredient_merge m "
+        "WHERE m.id = recipe_ingredient.ingredient_id) "
+        "WHERE ingredient_id IN (SELECT id FROM ingredient_merge)"
+    )
+    op.execute(
+        "UPDATE ingredient SET category_id = "
+        "(SELECT min(i.category_id) FROM ingredient_merge m "
+        "JOIN ingredient i ON i.id = m.id WHERE m.keep = ingredient.id) "
+        "WHERE category_id IS NULL "
+        "AND id IN (SELECT keep FROM ingredient_merge)"
+    )
+    op.execute(
+        "DELETE FROM ingredient WHERE id IN (SELECT id FROM ingredient_merge)"
+    )
+    op.drop_table('ingredient_merge')
+
+
+def upgrade():
+    op.create_index('ix_recipe_ingredient_recipe_id', 'recipe_ingredient',
+                    ['recipe_id'])
+    op.create_index('ix_recipe_ingredient_ingredient_id', 'recipe_ingredient',
+                    ['ingredient_id'])
+    op.create_index('ix_recipe_type_association_type_id',
+                    'recipe_type_association', ['type_id'])
+
+    merge_duplicate_ingredients()
+    op.create_index('uq_ingredient_name_lower', 'ingredient',
+                    [sa.text('lower(name)')], unique=True)
+
+
+def downgrade():
+    # Merged ingredients are not split up again.
+    op.drop_index('uq_ingredient_name_lower', table_name='ingredient')
+    op.drop_index('ix_recipe_type_association_type_id',
+                  table_name='recipe_type_association')
+    op.drop_index('ix_recipe_ingredient_ingredient_id',
+                  table_name='recipe_ingredient')
+    op.drop_index('ix_recipe_ingredient_recipe_id',
+                  table_name='recipe_ingredient')
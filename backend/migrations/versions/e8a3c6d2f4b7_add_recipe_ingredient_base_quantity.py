@@ -0,0 +1,85 @@
+"""Add canonical base quantity to recipe ingredients
+
+Revision ID: e8a3c6d2f4b7
+Revises: d5f2a8c7e1b3
+Create Date: 2026-10-18 18:05:36.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a3c6d2f4b7'
+down_revision = 'd5f2a8c7e1b3'
+branch_labels = None
+depends_on = None
+
+# rows converted per UPDATE while backfilling
+BATCH_SIZE = 10000
+
+# The unit table of app/recipes/units.py as of this revision, frozen so
+# later changes to it do not change what this migration does:
+# (base unit, factor, spellings).
+UNITS = (
+    ('g', 0.001, ('mg', 'milligram', 'milligrams')),
+    ('g', 1.0, ('g', 'gr', 'gram', 'grams', 'gramme', 'grammes')),
+    ('g', 1000.0, ('kg', 'kgs', 'kilogram', 'kilograms')),
+    ('ml', 1.0, ('ml', 'milliliter', 'milliliters', 'millilitre',
+                 'millilitres')),
+    ('ml', 1000.0, ('l', 'liter', 'liters', 'litre', 'litres')),
+    ('ml', 4.92892, ('tsp', 'tsps', 'teaspoon', 'teaspoons')),
+    ('ml', 14.7868, ('tbsp', 'tbs', 'tbsps', 'tablespoon', 'tablespoons')),
+    ('ml', 236.588, ('cup', 'cups')),
+)
+
+
+def _base_and_factor(column):
+    """SQL for the base unit and the factor converting ``column`` to it."""
+    unit = sa.func.lower(sa.func.trim(sa.func.coalesce(column, '')))
+    bases = {alias: base for base, _, aliases in UNITS for alias in aliases}
+    factors = {alias: factor
+               for _, factor, aliases in UNITS for alias in aliases}
+    return (sa.case(bases, value=unit, else_=unit),
+            sa.case(factors, value=unit, else_=sa.literal(1.0)))
+
+
+def upgrade():
+    op.add_column('recipe_ingredient',
+                  sa.Column('base_amount', sa.Float(), nullable=True))
+    op.add_column('recipe_ingredient',
+                  sa.Column('base_unit', sa.String(length=50), nullable=True))
+
+    # Convert the existing rows a range of ids at a time, so each statement
+    # only locks and rewrites a bounded slice of the table.
+    recipe_ingredient = sa.table(
+        'recipe_ingredient', sa.column('id', sa.Integer),
+        sa.column('amount', sa.Float), sa.column('unit', sa.String),
+        sa.column('base_amount', sa.Float), sa.column('base_unit', sa.String),
+    )
+    base_unit, factor = _base_and_factor(recipe_ingredient.c.unit)
+    connection = op.get_bind()
+    low, high = connection.execute(
+        sa.select(sa.func.min(recipe_ingredient.c.id),
+                  sa.func.max(recipe_ingredient.c.id))
+    ).one()
+    if low is not None:
+        for start in range(low, high + 1, BATCH_SIZE):
+            connection.execute(
+                recipe_ingredient.update()
+                .where(recipe_ingredient.c.id >= start,
+                       recipe_ingredient.c.id < start + BATCH_SIZE)
+                .values(base_amount=recipe_ingredient.c.amount * factor,
+                        base_unit=base_unit)
+            )
+
+    op.create_index('ix_recipe_ingredient_quantity', 'recipe_ingredient',
+                    ['ingredient_id', 'base_unit', 'base_amount'])
+
+
+def downgrade():
+    op.drop_index('ix_recipe_ingredient_quantity',
+                  table_name='recipe_ingredient')
+    with op.batch_alter_table('recipe_ingredient') as batch_op:
+        batch_op.drop_column('base_unit')
+        batch_op.drop_column('base_amount')
@@ -0,0 +1,33 @@
+"""Add recipe signature table
+
+Revision ID: f1c7b3e9a2d6
+Revises: e8a3c6d2f4b7
+Create Date: 2026-10-18 19:12:48.530664
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7b3e9a2d6'
+down_revision = 'e8a3c6d2f4b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left empty: the similar recipes index hashes and stores the signatures
+    # of existing recipes the first time it is built.
+    op.create_table(
+        'recipe_signature',
+        sa.Column('recipe_id', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('recipe_id')
+    )
+
+
+def downgrade():
+    op.drop_table('recipe_signature')
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+# Read by app.config when the app package is first imported.
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['DATABASE_REPLICA_URLS'] = ''
+os.environ['RESPONSE_CACHE'] = 'memory'
+os.environ['EXTRACTION_CACHE_PATH'] = ''
+
+from app import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,109 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from app.recipes.extraction import _streamed_field
+from app.recipes.json_stream import JSONStreamParser
+from benchmarks.fake_llm import FakeGroq
+
+CHUNK_SIZES = [1, 2, 3, 5, 8, 13]
+PROMPTS = [f"Recipe text {n}" for n in range(10)]
+
+
+def _messages(prompt):
+    return [{"role": "user", "content": prompt}]
+
+
+def _expected_events(document):
+    recipe = document['recipe']
+    events = [(('recipe', 'name'), recipe['name']),
+              (('recipe', 'types'), recipe['types'])]
+    events += [(('recipe', 'ingredients', i), ingredient)
+               for i, ingredient in enumerate(recipe['ingredients'])]
+    events.append((('recipe', 'steps'), recipe['steps']))
+    return events
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('prompt', PROMPTS)
+def test_parser_matches_one_shot_decode(chunk_size, prompt):
+    fake = FakeGroq(chunk_size=chunk_size)
+    reply = fake.create(model='m', messages=_messages(prompt))
+    document = json.loads(reply.choices[0].message.content)
+
+    parser = JSONStreamParser(_streamed_field)
+    events = []
+    for chunk in fake.create(model='m', messages=_messages(prompt),
+                             stream=True):
+        content = chunk.choices[0].delta.content
+        if content is not None:
+            events += parser.feed(content)
+
+    assert parser.done
+    assert parser.document == document
+    assert events == _expected_events(document)
+
+
+def test_parser_reports_fields_before_the_document_is_complete():
+    fake = FakeGroq(chunk_size=1)
+    stream = fake.create(model='m', messages=_messages(PROMPTS[0]),
+                         stream=True)
+    parser = JSONStreamParser(_streamed_field)
+    for chunk in stream:
+        events = parser.feed(chunk.choices[0].delta.content)
+        if events:
+            break
+    assert events == [(('recipe', 'name'), 'Synthetic "House" Recipe')]
+    assert not parser.done
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _read_events(body):
+    events = []
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines()
+                     if not line.startswith(':'))
+        if lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 8])
+def test_stream_endpoint_reports_stages_in_order(app, client, chunk_size):
+    app.extensions['llm_client'] = FakeGroq(chunk_size=chunk_size)
+    response = client.post(
+        '/api/recipes/process-image/stream',
+        data={'image': (io.BytesIO(_image()), 'recipe.png')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _read_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+
+    assert names[0] == 'accepted'
+    assert names[-1] == 'result'
+    assert [data['stage'] for name, data in events if name == 'stage'] == \
+        ['ocr', 'structuring']
+    ocr_tokens = [data['text'] for name, data in events
+                  if name == 'ocr_token']
+    assert ocr_tokens
+    ocr = names.index('ocr')
+    assert ''.join(ocr_tokens) == events[ocr][1]['text']
+    assert names.index('ocr_token') < ocr < names.index('name')
+
+    fields = [name for name in names
+              if name in ('name', 'types', 'ingredient', 'steps')]
+    result = events[-1][1]['recipe']
+    assert fields == ['name', 'types'] + \
+        ['ingredient'] * len(result['ingredients']) + ['steps']
+    streamed = [data['ingredient'] for name, data in events
+                if name == 'ingredient']
+    assert streamed == result['ingredients']
@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import cache, db
+from app.models import Ingredient, Recipe, RecipeIngredient, RecipeType, \
+    recipe_type_association
+
+PAGE_SIZE = 20
+
+
+def add_recipes(count):
+    """Add ``count`` recipes, each with two types and three ingredients."""
+    types = db.session.scalars(db.select(RecipeType.id)).all()
+    if not types:
+        types = db.session.scalars(
+            db.insert(RecipeType).returning(RecipeType.id),
+            [{'name': 'Dessert'}, {'name': 'Main'}]
+        ).all()
+    start = db.session.query(Recipe).count()
+    ingredient_ids = db.session.scalars(
+        db.insert(Ingredient).returning(Ingredient.id),
+        [{'name': f'ingredient {start + n}'} for n in range(count)]
+    ).all()
+    recipe_ids = db.session.scalars(
+        db.insert(Recipe).returning(Recipe.id),
+        [{'name': f'recipe {start + n}', 'steps': 'Mix.', 'source': ''}
+         for n in range(count)]
+    ).all()
+    db.session.execute(db.insert(RecipeIngredient), [
+        {'recipe_id': recipe_id, 'ingredient_id': ingredient_id,
+         'amount': 1, 'unit': 'g'}
+        for n, recipe_id in enumerate(recipe_ids)
+        for ingredient_id in ingredient_ids[n:n + 3]
+    ])
+    db.session.execute(recipe_type_association.insert(), [
+        {'recipe_id': recipe_id, 'type_id': type_id}
+        for recipe_id in recipe_ids for type_id in types
+    ])
+    db.session.commit()
+    cache.bump('recipe', 'ingredient', 'recipe_type')
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def get_page(client, after=0):
+    with count_statements() as statements:
+        response = client.get(f'/api/recipes/?limit={PAGE_SIZE}'
+                              f'&after={after}')
+    assert response.status_code == 200
+    return response.get_json(), len(statements)
+
+
+def test_statements_per_page_do_not_grow_with_the_catalogue(client):
+    add_recipes(PAGE_SIZE * 2)
+    page, small = get_page(client)
+    assert len(page['recipes']) == PAGE_SIZE
+    assert all(recipe['ingredients'] and recipe['types']
+               for recipe in page['recipes'])
+
+    add_recipes(PAGE_SIZE * 20)
+    page, large = get_page(client, after=page['next'])
+    assert len(page['recipes']) == PAGE_SIZE
+    assert large == small
+    # The page itself plus one query per relationship.
+    assert small <= 3
+
+
+def test_pages_follow_each_other(client):
+    add_recipes(PAGE_SIZE * 2 + 5)
+    seen, after = [], 0
+    while after is not None:
+        page, _ = get_page(client, after)
+        seen.extend(recipe['id'] for recipe in page['recipes'])
+        after = page['next']
+    assert seen == sorted(set(seen))
+    assert len(seen) == PAGE_SIZE * 2 + 5
@@ -0,0 +1,49 @@
+import pytest
+
+from app import db
+from app.ingredients.suggest import SuggestIndex, prefix_distance
+from app.models import Ingredient
+
+NAMES = ['Flour', 'Flour tortilla', 'Flaxseed', 'Sugar', 'Salt',
+         'Chocolate chips', 'Fennel']
+
+
+@pytest.fixture
+def index(app):
+    db.session.execute(db.insert(Ingredient), [{'name': n} for n in NAMES])
+    db.session.commit()
+    return SuggestIndex()
+
+
+def names(suggestions):
+    return [name for _, name in suggestions]
+
+
+def test_prefix_matches_come_first(index):
+    assert names(index.suggest('flo'))[:2] == ['Flour', 'Flour tortilla']
+
+
+@pytest.mark.parametrize('prefix', ['fluor', 'flpur', 'folur', 'glour',
+                                    'flor', 'flouur'])
+def test_one_typo_prefixes_find_the_name(index, prefix):
+    assert names(index.suggest(prefix))[0] == 'Flour'
+
+
+def test_two_typos_need_a_long_prefix(index):
+    assert names(index.suggest('chocolqte chpis'))[0] == 'Chocolate chips'
+    assert 'Sugar' not in names(index.suggest('sgara'))
+
+
+def test_unrelated_prefixes_find_nothing(index):
+    assert index.suggest('xyz') == []
+
+
+@pytest.mark.parametrize('prefix, name, distance', [
+    ('flo', 'flour', 0),
+    ('fluor', 'flour', 1),
+    ('flour', 'flour tortilla', 0),
+    ('fl', 'flour', 0),
+    ('xyz', 'flour', 2),
+])
+def test_prefix_distance(prefix, name, distance):
+    assert prefix_distance(prefix, name, 1) == distance